@@ -18,13 +18,23 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 ### Libraries ###
 import numpy as np
-import matplotlib.animation as animation # to save the "animation object"
 
 
 ### My own imports ###
 from integral_solver import IS # solve the integrals
-from svg_handler import SVG_Handler # handle the svg files as "a function"
-from animation import fourier_animation # animate the whole thing
+from svg_handler import SVG_Handler, load_handler # handle the svg files as "a function"
+from fourier_series import (get_fourier_coeff, get_fourier_coeff_parallel, FFT_MODE_GAUSS, FFT_MODE_UNIFORM, METHOD_FFT, # the fourier series itself (public API)
+                            get_fourier_coeff_fft, fourier_eval_chunks, fourier_eval, get_fourier_vector_line,
+                            get_fourier_data_chunks, get_fourier_data, get_fourier_latex, get_desmos_string)
+from raw_renderer import save_raw_video # renders the video without matplotlib
+from frame_store import FrameStore # memory-mapped frames for long animations
+from coefficient_cache import CoefficientCache, get_coeff_params # skips the calculation if the coefficients are known already
+from coefficient_store import CoefficientStore # a different N reuses the known coefficients
+from coefficient_set import FourierCoefficientSet # drops the smallest coefficients
+from frame_source import FourierFrameSource # frames calculated on demand
+from progressive_preview import ProgressivePreview, get_levels # coarse preview first, refined in the background
+import instrumentation # stage timings (enabled with the environment variable FOURIER_TRACE)
+# the animation (matplotlib) is only imported in main, so that the calculation can be used without it
 
 
 def func_1(t:list):
@@ -32,146 +42,133 @@ def func_1(t:list):
     return ret_arr
     
 
-def get_fourier_coeff(func, T=[0, 1], N=4):
-    indizes = np.arange(-N, N+1)
-    coeff = np.empty(indizes.shape, dtype=complex)
-    
-    period = T[1] - T[0]
-    for k, ind in enumerate(indizes):
-        solver = IS(lambda t: func(t)*np.exp(2j*np.pi*ind/period * t), T)
-        coeff[k] = solver.get_approximation(200, n_gauss_param=6)
-    
-    return indizes, coeff
-    
-
-def fourier_eval(ind, coeff, t_eval, period=1):
-    if isinstance(t_eval, float) or isinstance(t_eval, int):
-        return sum([coeff_t * np.exp(2j*np.pi*ind_t/period * t_eval) for ind_t, coeff_t in zip(ind, coeff)])
-        
-    ### otherwise, it must be a list... ###
-    ret_values = np.zeros(t_eval.shape, dtype=complex)
-    
-    for i, t_t in enumerate(t_eval):
-        ret_values[i] = sum([coeff_t * np.exp(2j*np.pi*ind_t/period * t_t) for ind_t, coeff_t in zip(ind, coeff)])
-        #ret_values[i] = ret_values[i-1] + coeff[i] * np.exp(2j*np.pi*ind[i]/period * t_t)
-
-    return ret_values
-
-
-def get_fourier_vector_line(t, coeff, ind, period=1):
-    new_indizes = np.argsort(-np.abs(coeff)) # sort absolute value of coeffs backwards --> print "long" vectors first
-    #print(new_indizes)
-    coeff_use = coeff[new_indizes]
-    ind_use = ind[new_indizes]
-    
-    ret_line = np.zeros(len(coeff)+1, dtype=complex) # stores all complex values for the line
-    ret_line[0] = 0
-    for i in range(1, coeff_use.shape[0]+1):
-        ret_line[i] = ret_line[i-1] + coeff_use[i-1] * np.exp(2j*np.pi*ind_use[i-1]/period * t) # much much faster...
-        #ret_line[i] = fourier_eval(ind_use[:i], coeff_use[:i], t)
-    return ret_line
-
-def get_fourier_latex(coeff, ind, coeff_per_line=4): # returns "formatted" latex code to copy the coefficients
-    ret_str = "{}&{} " + "{:.4f}".format(coeff[0])
-    
-    for i, c in enumerate(coeff[1:]):
-        if (i+1) % coeff_per_line == 0:
-            ret_str += ", " + " \\\\ \n{}&{}" + "{:.4f}".format(c)
-        else:
-            ret_str += ", " +  "{:.4f}".format(c)
-    
-    return ret_str.replace('j', 'i')
-
-def get_desmos_string(coeff, ind): # returns 2D vector with sin and cos-funcs to copy into desmos
-    def num_f(number, sign=False):
-        if sign:
-            return "{:+.5f}".format(number).rstrip('0').rstrip('.')
-        else:
-            return "{:.5f}".format(number).rstrip('0').rstrip('.')
-    
-    real_string = ""
-    imag_string = ""
-    
-    threshold = 1e-5
-    for c, k in zip(coeff, ind):
-        #print(num_f(c.real, sign=True))
-        if np.abs(c.real) > threshold:
-            real_string += f"{num_f(c.real, sign=True)}*cos({2*k}*\\pi*t) "
-            
-            imag_string += f"{num_f(-c.real, sign=True)}*sin({2*k}*\\pi*t) "
-        if np.abs(c.imag) > threshold:
-            real_string += f"{num_f(-c.imag, sign=True)}*sin({2*k}*\\pi*t) "
-            
-            imag_string += f"{num_f(-c.imag, sign=True)}*cos({2*k}*\\pi*t) " # negative sign to "flip" imaginary part (why ever this is necessary)
-            
-    
-    #print(real_string)
-    # just makes the string a bit nicer (I know, the following line does not contain nice Code lol)
-    return f"({real_string} , {imag_string})".replace(" ", "")#.replace("       ", "").replace("     ", "").replace("    ", "").replace("   ", "").replace("  ", "")
-
 def main():    
     
-    # read svg-file (change path for you own svg-file)
-    handler = SVG_Handler("images/weih_f6.svg")
+    # svg-file to read (change path for you own svg-file), a compiled file (.npz, see SVG_Handler.export_compiled) is loaded without parsing
+    svg_path = "images/weih_f6.svg"
     
     
     save_video = True # true to save animation as a video (might take some time)
+    raw_video = False # renders the video with numpy and pipes the frames into ffmpeg (much faster, but without axes and labels)
     only_fourier_calc = False # will not take into account the animation --> way faster if you just want for example the desmos equation
     simple_plot = False # true to not calculate the animation (for "fast" testing)
+    progressive_preview = False # shows a coarse animation (small N) at once and refines it in the background (for tuning drawings, nothing is saved)
+    fast_render = True # only redraws the moving parts of the animation (blitting)
+    parametrization = SVG_Handler.PARAM_UNIFORM # SVG_Handler.PARAM_ARC_LENGTH spends the samples where the geometry is (needs less N for "free hand drawings")
     plot_reverse = True # animates the picture in reverse (for example if you have a text)
+    fft_coefficients = True # calculates all coefficients with a few FFTs instead of one quadrature per coefficient (same result, much faster)
+    n_workers = 1 # number of processes for the quadrature without fft_coefficients (None uses every core)
+    use_cache = True # stores the coefficients in ".fourier_cache", a second run with the same svg-file and parameters skips the calculation
+                     # (a smaller fourier_N is taken from the cached coefficients, a larger one only calculates the new ones)
     
     
     fourier_N = 160 # number of fourier coefficients, will calculate from k=-N up to k=N.
                     # In the old version, to many coefficients would have needed much more time.
                     # However, this is not as drastic since 04/15/2022, because the runtime has been improved a lot (explained in GitHub).
+    prune_energy = None # for example 0.99999: only the largest coefficients that hold this fraction of the energy are used (fewer epicycles, faster)
+    prune_error = None # drops the smallest coefficients as long as every point moves at most by this distance
     
     T = [0, 1]     # "period" of your image (other intervals will work to, but could break the algorithm if "reverse" is set to true (sorry))
     
     animation_time = 30 # time in seconds that the animation will take
     n_eval = 3000 # number of evaluations on the function (normally "25*animation_time" should be the most efficient)
+    lazy_frames = False # calculates every frame of the animation only when it is shown (instant start, less memory)
+    frame_store_path = None # for example "frames.npy": writes the animation data into a memory-mapped file instead of RAM (for long animations or large N)
     t_eval = np.linspace(T[0], T[1], n_eval) 
-    
-    
-    ind, coeff = get_fourier_coeff(lambda t: handler.get_point(t, reverse=plot_reverse), T=T, N=fourier_N) # calculates the fourier coefficients
+    global anim # needs to be global, otherwise the animation will just stop after the algorithm is done
+    
+    if progressive_preview:
+        from animation import fourier_animation # animate the whole thing
+        handler = load_handler(svg_path, parametrization=parametrization)
+        preview = ProgressivePreview(lambda t: handler.get_point(t, reverse=plot_reverse), T=T, levels=get_levels(fourier_N, n_eval))
+        figure_data, fourier_data = preview.get_first()
+        preview.start()
+        anim = fourier_animation(figure_data, fourier_data, animation_time=animation_time, fast_render=fast_render, data_updates=preview.get_update)
+        preview.close()
+        return
+    
+    
+    def calc_coeff(): # reads the svg-file and calculates the fourier coefficients
+        with instrumentation.stage("svg_load"):
+            handler = load_handler(svg_path, parametrization=parametrization)
+        if fft_coefficients:
+            return get_fourier_coeff_fft(lambda t: handler.get_point(t, reverse=plot_reverse), T=T, N=fourier_N)
+        elif n_workers == 1:
+            return get_fourier_coeff(handler.get_compiled_curve(reverse=plot_reverse), T=T, N=fourier_N)
+        else:
+            return get_fourier_coeff_parallel(handler.get_compiled_curve(reverse=plot_reverse), T=T, N=fourier_N, n_workers=n_workers)
+    
+    def make_store(): # extends cached coefficients of a smaller fourier_N
+        with instrumentation.stage("svg_load"):
+            handler = load_handler(svg_path, parametrization=parametrization)
+        return CoefficientStore(lambda t: handler.get_point(t, reverse=plot_reverse), T=T, method_string=METHOD_FFT if fft_coefficients else IS.Z_GAUSS_QUAD)
+    
+    with instrumentation.stage("coefficients", N=fourier_N):
+        if use_cache:
+            # the defaults of get_coeff_params are the ones used by calc_coeff and CoefficientStore, one entry for every fourier_N
+            coeff_params = get_coeff_params(N=None, T=T, reverse=plot_reverse, parametrization=parametrization,
+                                            method=METHOD_FFT if fft_coefficients else IS.Z_GAUSS_QUAD)
+            ind, coeff = CoefficientCache().get_growing_coeff(svg_path, fourier_N, calc_coeff, make_store, **coeff_params)
+        else:
+            ind, coeff = calc_coeff()
     print("Calculation of fourier coefficients done.")
     
+    presorted = False # True after pruning, the frames don't need to sort the coefficients again
+    if not (prune_energy is None and prune_error is None):
+        coeff_set = FourierCoefficientSet(ind, coeff, period=T[1]-T[0]).prune(energy_fraction=prune_energy, max_error=prune_error)
+        ind, coeff = coeff_set.ind, coeff_set.coeff # sorted by absolute value, every following step only uses the kept terms
+        presorted = True
+        print(f"{len(coeff_set)} of {2*fourier_N+1} coefficients kept (error at most {coeff_set.error_bound:.3g}, rms error {coeff_set.rms_error:.3g}).")
+    
     # outputs the latex/desmos code (comment out if you don't want it)
     #print("\n" + get_fourier_latex(coeff, ind) + "\n")
     #print("\n" + get_desmos_string(coeff, ind) + "\n")
         
     
     if not only_fourier_calc:
+        import matplotlib.animation as animation # to save the "animation object"
+        from animation import fourier_animation # animate the whole thing
+        
         ### get the data of the fourier graph ###
-        fourier_evaluated = fourier_eval(ind, coeff, t_eval, period=T[1]-T[0])
-        figure_data = np.empty((t_eval.shape[0], 2))
-        figure_data[:,0] = np.real(fourier_evaluated)
-        figure_data[:,1] = -np.imag(fourier_evaluated)
+        with instrumentation.stage("evaluation", n_eval=n_eval):
+            fourier_evaluated = fourier_eval(ind, coeff, t_eval, period=T[1]-T[0])
+            figure_data = np.empty((t_eval.shape[0], 2))
+            figure_data[:,0] = np.real(fourier_evaluated)
+            figure_data[:,1] = -np.imag(fourier_evaluated)
         
         ### get the data for every single "fourier-vector representation" (animation) ###
-        if simple_plot:
-            fourier_data = None
-        else:
-            fourier_data = np.empty((t_eval.shape[0], coeff.shape[0]+1, 2))
-            for i, time in enumerate(t_eval):
-                tmp_vector_line = get_fourier_vector_line(time, coeff, ind)
-                fourier_data[i,:,0] = np.real(tmp_vector_line) # x coordinates
-                fourier_data[i,:,1] = -np.imag(tmp_vector_line) # y coordinates
-                if i % (n_eval // 20) == 0:
-                    print(f"{i} of {n_eval} pointers calculated.")
+        with instrumentation.stage("frames", n_eval=n_eval):
+            data_bounds = None
+            if simple_plot:
+                fourier_data = None
+            elif lazy_frames:
+                fourier_data = FourierFrameSource(t_eval, coeff, ind, period=T[1]-T[0])
+                data_bounds = fourier_data.bounds
+            elif frame_store_path is None:
+                fourier_data = get_fourier_data(t_eval, coeff, ind, period=T[1]-T[0], presorted=presorted)
+            else:
+                frame_store = FrameStore(frame_store_path, t_eval.shape[0], coeff.shape[0]+1)
+                frame_store.write(get_fourier_data_chunks(t_eval, coeff, ind, period=T[1]-T[0], presorted=presorted))
+                fourier_data, data_bounds = frame_store, frame_store.bounds # the store (not its memmap), so that worker processes map the file again
             
         
         print("Calculation of data points from coefficients done.")
-        global anim # needs to be global, otherwise the animation will just stop after the algorithm is done
-        anim = fourier_animation(figure_data, fourier_data, plot_reference=False or simple_plot, handler=handler, plot_whole_approximation=False or simple_plot,
-                                 animation_time=animation_time)
+        with instrumentation.stage("animation_setup"):
+            handler = load_handler(svg_path) if simple_plot else None # only needed for the reference plot
+            anim = fourier_animation(figure_data, fourier_data, plot_reference=False or simple_plot, handler=handler, plot_whole_approximation=False or simple_plot,
+                                     animation_time=animation_time, fast_render=fast_render, data_bounds=data_bounds)
         print("Animation object created.")
         
         ### save a video of the animation ###
         if save_video:
             print("Begin saving the video.")
-            Writer = animation.writers['ffmpeg']
-            writer = Writer(fps=25, metadata=dict(artist='Me'), bitrate=30000)
-            anim.save('test.mp4', writer=writer)
+            with instrumentation.stage("encoding", raw_video=raw_video):
+                if raw_video:
+                    save_raw_video(figure_data, fourier_data, 'test.mp4', animation_time=animation_time, fps=25, n_workers=None, bounds=data_bounds)
+                else:
+                    Writer = animation.writers['ffmpeg']
+                    writer = Writer(fps=25, metadata=dict(artist='Me'), bitrate=30000)
+                    anim.save('test.mp4', writer=writer)
             print("Done.")
         
 
@@ -22,7 +22,30 @@ import matplotlib.animation as animation
 
 
 
-def fourier_animation(figure_data, fourier_data, plot_reference=False, handler=None, plot_whole_approximation=False, animation_time=20):
+def _get_frame_function(fourier_data): # returns a function frame index -> (points, 2) array of the "coefficient line"
+    if hasattr(fourier_data, "__getitem__"): # numpy array, memory-mapped array, FrameStore or FourierFrameSource
+        return fourier_data.__getitem__
+    if callable(fourier_data):
+        return fourier_data
+    
+    # iterator, yields the frames that are shown one after the other
+    iterator = iter(fourier_data)
+    last_frame = {}
+    def next_frame(num):
+        if not num in last_frame:
+            try:
+                frame = next(iterator)
+            except StopIteration: # animation repeats, but the iterator is exhausted --> keep the last frame
+                frame = last_frame.popitem()[1]
+            last_frame.clear()
+            last_frame[num] = frame
+        return last_frame[num]
+    return next_frame
+
+
+
+def fourier_animation(figure_data, fourier_data, plot_reference=False, handler=None, plot_whole_approximation=False, animation_time=20,
+                      fast_render=False, show=True, data_bounds=None, data_updates=None):
     '''
     Parameters
     ----------
@@ -33,27 +56,104 @@ def fourier_animation(figure_data, fourier_data, plot_reference=False, handler=N
         Axis 0: N number of data points
         Axis 1: number of points from the fourier coefficients
         Axis 2: x and y of "coefficient line"
+        Instead of an array also a frame source is possible, so that frames are computed only when they are shown:
+        an object with __getitem__ (for example FourierFrameSource), a callable (data point index -> frame)
+        or an iterator that yields the frames that are shown one after the other.
+        A frame source needs data_bounds (or a "bounds" attribute).
     handler : svg handler object necessary for the "reference whole plot"
+    fast_render : uses blitting, only the moving artists (graph and fourier vector) are drawn every frame,
+                  everything else (reference, grid, ...) is drawn once and cached as background
+    show : False to skip plt.show() (for example for headless runs that only save the animation)
+    data_bounds : optional ((x_min, x_max), (y_min, y_max)) of fourier_data, so that it does not need to be scanned
+                  (for example FrameStore.bounds of a memory-mapped fourier_data)
+    data_updates : optional callable without parameters that is called every frame, it returns None or a new tuple
+                   (figure_data, fourier_data) that replaces the shown data in place (for example ProgressivePreview.get_update).
+                   The axis limits of the first data are kept.
     '''
     t_stop = animation_time                 # length of animation in seconds
     N = figure_data.shape[0]    # number of data points
     frames_per_sec = 25         # frames per second of animation
-    plot_speed = int(N / t_stop / frames_per_sec)    
-    if plot_speed==0:
-        plot_speed = 1 # 0 does not work
+    if data_updates is None:
+        plot_speed = int(N / t_stop / frames_per_sec)    
+        if plot_speed==0:
+            plot_speed = 1 # 0 does not work
+        
+        n_frames = N // plot_speed
+        data_scale = plot_speed # data point index of a frame is num*data_scale (changes if the data is replaced)
+    else: # the levels have different numbers of points, so the duration is given by animation_time and not by the first level
+        n_frames = max(1, int(round(t_stop * frames_per_sec)))
+        data_scale = N / n_frames
+    trace_end = None # with blitting: index of the last point of the graph that is drawn into trace_background
+    clean_background, trace_background = None, None # axes without the graph (after every full draw) and with the graph up to trace_end
+    
+    if not fourier_data is None:
+        get_frame = _get_frame_function(fourier_data)
+        first_frame = get_frame(0)
 
     
-    def update_lines(num): # Das passiert pro "frame" während der Animation
-        num = num * plot_speed
+    def replace_data(new_figure_data, new_fourier_data): # shows new data (see data_updates)
+        nonlocal figure_data, fourier_data, get_frame, data_scale, trace_end
+        figure_data, fourier_data = new_figure_data, new_fourier_data
+        data_scale = figure_data.shape[0] / n_frames # same fraction of the graph at the current frame --> remaining points / remaining frames
+        trace_end = None # the background shows the graph of the old data
+        if plot_whole_approximation:
+            whole_graph[0].set_data(figure_data[:,0], figure_data[:,1])
+        if not fourier_data is None:
+            get_frame = _get_frame_function(fourier_data)
+            status_text.set_text(f"N = {get_frame(0).shape[0]-1}")
+    
+    
+    def store_clean_background(event): # after every full draw (first frame, resize, zoom), the graph is animated and not drawn
+        nonlocal clean_background, trace_end
+        if not fig.canvas.is_saving():
+            clean_background, trace_end = fig.canvas.copy_from_bbox(ax.bbox), None
+    
+    
+    def draw_trace(num):
+        '''
+        Blitting: the graph up to the last frame is kept as own background, only the new segment is drawn onto it
+        (and the background is copied again), so a frame does not depend on the length of the graph.
+        FuncAnimation draws the other animated artists on top of it.
+        '''
+        nonlocal trace_end, trace_background
+        if clean_background is None: # nothing drawn yet
+            graph[0].set_data(figure_data[:num+1,0], figure_data[:num+1,1])
+            return
+        if trace_end is None or num < trace_end: # new background, the animation repeats or the data was replaced
+            fig.canvas.restore_region(clean_background)
+            start = 0
+        else:
+            fig.canvas.restore_region(trace_background)
+            start = trace_end
+        graph[0].set_data(figure_data[start:num+1,0], figure_data[start:num+1,1])
+        ax.draw_artist(graph[0])
+        trace_background, trace_end = fig.canvas.copy_from_bbox(ax.bbox), num
+    
+    
+    def update_lines(num, init=False): # Das passiert pro "frame" während der Animation
+        if not data_updates is None:
+            new_data = data_updates()
+            if not new_data is None:
+                replace_data(*new_data)
+        num = min(int(num * data_scale), figure_data.shape[0]-1)
         
         if not plot_whole_approximation:
-            graph[0].set_data(figure_data[:num+1,0], figure_data[:num+1,1])
+            if fast_render and not init and not fig.canvas.is_saving():
+                draw_trace(num)
+            else: # full redraw (also when the animation is saved)
+                graph[0].set_data(figure_data[:num+1,0], figure_data[:num+1,1]) # views, the data is not copied
         
         if not fourier_data is None:
-            fourier_vector[0].set_data(fourier_data[num,:,0], fourier_data[num,:,1])
+            frame = get_frame(num)
+            fourier_vector[0].set_data(frame[:,0], frame[:,1])
         
+        return animated_artists
     
     
+    def init_lines(): # first frame (needed for blitting)
+        nonlocal trace_end
+        trace_end = None
+        return update_lines(0, init=True)
     
     
     
@@ -62,8 +162,13 @@ def fourier_animation(figure_data, fourier_data, plot_reference=False, handler=N
         ax = plt.axes()
     else:
         add_margin = 0.1 # 10% more margin
-        x_lim = (np.amin(fourier_data[...,0]), np.amax(fourier_data[...,0]))
-        y_lim = (np.amin(fourier_data[...,1]), np.amax(fourier_data[...,1]))
+        if data_bounds is None:
+            data_bounds = getattr(fourier_data, "bounds", None)
+        if data_bounds is None:
+            assert isinstance(fourier_data, np.ndarray), "A frame source needs data_bounds"
+            data_bounds = ((np.amin(fourier_data[...,0]), np.amax(fourier_data[...,0])),
+                           (np.amin(fourier_data[...,1]), np.amax(fourier_data[...,1])))
+        x_lim, y_lim = data_bounds
         x_abs, y_abs = x_lim[1]-x_lim[0], y_lim[1]-y_lim[0]
         
         fig = plt.figure(figsize=(2*10, 2*12*y_abs/x_abs)) # (12,8)
@@ -75,35 +180,43 @@ def fourier_animation(figure_data, fourier_data, plot_reference=False, handler=N
     ### plot the picture to be approximated ###
     if plot_reference:
         assert not handler is None, "Need svg handler if whole plot should be painted"
-        x_whole, y_whole = handler.get_whole_image()
-        for i, (x_tmp, y_tmp) in enumerate(zip(x_whole, y_whole)):
-            if i==0:
-                ax.plot(x_tmp, y_tmp, label="Whole Image")
-            else:
-                ax.plot(x_tmp, y_tmp, color="tab:blue")
+        reference_points = handler.get_reference_geometry() # all paths in one array (separated by NaN)
+        ax.plot(reference_points[:,0], reference_points[:,1], label="Whole Image")
             
             
     if not fourier_data is None:
-        fourier_N = fourier_data.shape[1]-1
+        fourier_N = first_frame.shape[0]-1
     else:
         fourier_N = "None"
     
     if plot_whole_approximation:
         #plt.plot(np.real(ret_values), -np.imag(ret_values), label=f"Fourier N = {fourier_N}")
-        ax.plot(figure_data[:,0], figure_data[:,1], label=f"Fourier Graph N = {fourier_N}", zorder=2)
+        whole_graph = ax.plot(figure_data[:,0], figure_data[:,1], label=f"Fourier Graph N = {fourier_N}", zorder=2,
+                              animated=fast_render and not data_updates is None)
 
     
+    if fast_render and not plot_whole_approximation:
+        fig.canvas.mpl_connect("draw_event", store_clean_background)
+    
+    animated_artists = [] # artists that change every frame
+    if plot_whole_approximation and not data_updates is None:
+        animated_artists += whole_graph
+    if not data_updates is None: # current N, the title is outside of the blitted area
+        status_text = ax.text(0.02, 0.98, f"N = {fourier_N}", transform=ax.transAxes, va="top", animated=fast_render)
+        animated_artists += [status_text]
     if not plot_whole_approximation:
-        graph = ax.plot([figure_data[0,0]], [figure_data[0,1]], label=f"Fourier Graph N = {fourier_N}", zorder=2)
+        graph = ax.plot([figure_data[0,0]], [figure_data[0,1]], label=f"Fourier Graph N = {fourier_N}", zorder=2, animated=fast_render)
+        animated_artists += graph
     
     if not fourier_data is None:
-        fourier_vector = ax.plot(fourier_data[0,:,0], fourier_data[0,:,1], "-o", markersize=1.8, linewidth=0.5,
-                                 label=f"Fourier Vector N = {fourier_data.shape[1]-1}", zorder=3)
+        fourier_vector = ax.plot(first_frame[:,0], first_frame[:,1], "-o", markersize=1.8, linewidth=0.5,
+                                 label=f"Fourier Vector N = {fourier_N}", zorder=3, animated=fast_render)
+        animated_artists += fourier_vector
    
     
     # Creating the Animation object
-    animation_obj = animation.FuncAnimation(fig, update_lines, frames=figure_data.shape[0] // plot_speed,
-                                            interval=1000 // frames_per_sec, repeat=True, blit=False)
+    animation_obj = animation.FuncAnimation(fig, update_lines, frames=n_frames, init_func=init_lines if fast_render else None,
+                                            interval=1000 // frames_per_sec, repeat=True, blit=fast_render)
     
     
     ax.set_title(f"Animation - Fourier Series, N = {fourier_N}")
@@ -111,7 +224,8 @@ def fourier_animation(figure_data, fourier_data, plot_reference=False, handler=N
     ax.set_xlabel("x")
     ax.set_ylabel("y")
     plt.gca().set_aspect('equal', adjustable='box')
-    plt.show()
+    if show:
+        plt.show()
     
     return animation_obj # Return of the animation object so that animation does not stop
 
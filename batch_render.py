@@ -0,0 +1,260 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+import os
+import glob
+import json
+import time
+import queue
+import argparse
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from svg_handler import SVG_Handler, load_handler
+from coefficient_cache import CoefficientCache, get_coeff_params
+from fourier_series import get_fourier_coeff_fft, fourier_eval, get_fourier_data
+
+
+# settings of every job, a manifest entry can overwrite each of them (same meaning as in FourierMain.main)
+DEFAULT_JOB = {
+    "N": 160,
+    "T": [0, 1],
+    "reverse": True,
+    "parametrization": SVG_Handler.PARAM_UNIFORM,
+    "animation_time": 30,
+    "n_eval": 3000,
+    "fps": 25,
+    "bitrate": 30000,
+    "render": True, # False only saves the coefficients (.npz)
+    "use_cache": True,
+}
+
+_STOP = None # marks the end of a queue
+
+
+### stages (module level functions, so that they can be sent to worker processes) ###
+
+def _load_stage(job, data): # reads the svg-file, nothing is read if the coefficients are already cached
+    if job["use_cache"]:
+        cache = CoefficientCache()
+        cached = cache.load(cache.get_key(job["svg"], **_get_coeff_params(job)))
+        if not cached is None:
+            return {"coeff": cached}
+    return {"curve": load_handler(job["svg"], parametrization=job["parametrization"]).get_compiled_curve(reverse=job["reverse"])}
+
+
+def _coeff_stage(job, data):
+    if not "coeff" in data:
+        ind, coeff = get_fourier_coeff_fft(data["curve"], T=job["T"], N=job["N"])
+        if job["use_cache"]:
+            cache = CoefficientCache()
+            cache.save(cache.get_key(job["svg"], **_get_coeff_params(job)), ind, coeff)
+        data = {"coeff": (ind, coeff)}
+    return data
+
+
+def _render_stage(job, data):
+    ind, coeff = data["coeff"]
+    if not job["render"]:
+        np.savez(job["output"], ind=ind, coeff=coeff)
+        return {}
+
+    import matplotlib
+    matplotlib.use("Agg") # worker processes have no display
+    import matplotlib.animation as animation
+    from animation import fourier_animation
+
+    T = job["T"]
+    t_eval = np.linspace(T[0], T[1], job["n_eval"])
+    fourier_evaluated = fourier_eval(ind, coeff, t_eval, period=T[1]-T[0])
+    figure_data = np.empty((t_eval.shape[0], 2))
+    figure_data[:,0] = np.real(fourier_evaluated)
+    figure_data[:,1] = -np.imag(fourier_evaluated)
+    fourier_data = get_fourier_data(t_eval, coeff, ind, period=T[1]-T[0])
+
+    anim = fourier_animation(figure_data, fourier_data, animation_time=job["animation_time"], fast_render=True, show=False)
+    writer = animation.writers['ffmpeg'](fps=job["fps"], metadata=dict(artist='Me'), bitrate=job["bitrate"])
+    anim.save(job["output"], writer=writer)
+    return {}
+
+
+def _get_coeff_params(job): # coefficients of get_fourier_coeff_fft with its defaults (see _coeff_stage)
+    return get_coeff_params(N=job["N"], T=job["T"], reverse=job["reverse"], parametrization=job["parametrization"])
+
+
+
+### pipeline ###
+
+def get_jobs(pattern=None, manifest=None, output_dir="videos"):
+    '''
+    Parameters
+    ----------
+    pattern    : glob of svg-files (for example "images/*.svg"), every file is one job with the default settings
+    manifest   : path of a json-file with a list of jobs, every job needs "svg" and can overwrite the settings in DEFAULT_JOB and "output"
+    output_dir : directory of the videos (or coefficients) if a job has no "output"
+
+    Returns
+    -------
+    List of job-dicts
+    '''
+    entries = []
+    if not pattern is None:
+        entries += [{"svg": svg_path} for svg_path in sorted(glob.glob(pattern))]
+    if not manifest is None:
+        with open(manifest) as manifest_file:
+            entries += json.load(manifest_file)
+
+    jobs = []
+    for entry in entries:
+        job = dict(DEFAULT_JOB, **entry)
+        name = os.path.splitext(os.path.basename(job["svg"]))[0]
+        job.setdefault("name", name)
+        job.setdefault("output", os.path.join(output_dir, name + (".mp4" if job["render"] else ".npz")))
+        jobs += [job]
+    return jobs
+
+
+class _Stage():
+
+    def __init__(self, name, func, executor, n_workers, in_queue, out_queue):
+        '''
+        Takes jobs from in_queue, runs func in the executor (at most n_workers at the same time) and puts them into out_queue.
+        A full out_queue blocks the stage (bounded memory if one stage is slower than the next one).
+        '''
+        self.name, self.func, self.executor = name, func, executor
+        self.in_queue, self.out_queue = in_queue, out_queue
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(n_workers)]
+
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+
+    def _run(self):
+        while True:
+            item = self.in_queue.get()
+            if item is _STOP:
+                self.in_queue.put(_STOP) # the other threads of this stage need to stop too
+                return
+
+            job, data = item
+            if job["status"] == "running":
+                start_time = time.perf_counter()
+                try:
+                    data = self.executor.submit(self.func, job, data).result()
+                except Exception:
+                    job["status"], job["error"] = "failed", f"{self.name}: " + traceback.format_exc()
+                job["timings"][self.name] = time.perf_counter() - start_time
+            self.out_queue.put((job, data))
+
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+        self.out_queue.put(_STOP)
+
+
+
+def run_batch(jobs, n_load_workers=2, n_coeff_workers=None, n_render_workers=None, queue_size=4, report_path=None):
+    '''
+    Runs every job through the stages "load" (svg), "coefficients" and "render" (video encoding).
+    Every stage has its own pool of worker processes, the queues between the stages hold at most queue_size jobs.
+
+    Parameters
+    ----------
+    jobs : list of job-dicts (see get_jobs)
+    n_..._workers : number of processes of the stage (None uses every core)
+    report_path : optional, json-file for the status and timings of every job
+
+    Returns
+    -------
+    Report-dict
+    '''
+    n_cores = os.cpu_count() or 1
+    n_coeff_workers = n_coeff_workers or n_cores
+    n_render_workers = n_render_workers or n_cores
+
+    for job in jobs:
+        job.update(status="running", error=None, timings={})
+        output_dir = os.path.dirname(job["output"])
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(4)]
+    executors = [ProcessPoolExecutor(max_workers=n) for n in (n_load_workers, n_coeff_workers, n_render_workers)]
+    stages = [_Stage("load", _load_stage, executors[0], n_load_workers, queues[0], queues[1]),
+              _Stage("coefficients", _coeff_stage, executors[1], n_coeff_workers, queues[1], queues[2]),
+              _Stage("render", _render_stage, executors[2], n_render_workers, queues[2], queues[3])]
+
+    start_time = time.perf_counter()
+    for stage in stages:
+        stage.start()
+
+    def feed(): # fills the first queue (blocks while it is full)
+        for job in jobs:
+            queues[0].put((job, None))
+        queues[0].put(_STOP)
+    threading.Thread(target=feed, daemon=True).start()
+
+    def close(): # stops every stage after the previous one is done
+        for stage in stages:
+            stage.join()
+    threading.Thread(target=close, daemon=True).start()
+
+    while queues[3].get() is not _STOP: # the results are stored in the job-dicts
+        pass
+    for executor in executors:
+        executor.shutdown()
+
+    for job in jobs:
+        if job["status"] == "running":
+            job["status"] = "done"
+
+    report = {"total_time": time.perf_counter() - start_time,
+              "done": sum([job["status"] == "done" for job in jobs]),
+              "failed": sum([job["status"] == "failed" for job in jobs]),
+              "jobs": jobs}
+    if not report_path is None:
+        if os.path.dirname(report_path):
+            os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        with open(report_path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+    return report
+
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Calculates the fourier series and renders the animation of many svg-files.")
+    parser.add_argument("pattern", nargs="?", default=None, help='glob of svg-files, for example "images/*.svg"')
+    parser.add_argument("--manifest", default=None, help="json-file with a list of jobs")
+    parser.add_argument("--output-dir", default="videos")
+    parser.add_argument("--load-workers", type=int, default=2)
+    parser.add_argument("--coeff-workers", type=int, default=None)
+    parser.add_argument("--render-workers", type=int, default=None)
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--report", default=None, help="json-file for the report (default: OUTPUT_DIR/batch_report.json)")
+    args = parser.parse_args()
+
+    jobs = get_jobs(args.pattern, args.manifest, args.output_dir)
+    report = run_batch(jobs, args.load_workers, args.coeff_workers, args.render_workers, args.queue_size,
+                       report_path=args.report or os.path.join(args.output_dir, "batch_report.json"))
+    print(f"{report['done']} of {len(jobs)} jobs done in {report['total_time']:.1f}s, {report['failed']} failed.")
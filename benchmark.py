@@ -0,0 +1,278 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+
+from integral_solver import IS
+from svg_handler import SVG_Handler
+from fourier_series import (get_fourier_coeff, get_fourier_coeff_parallel, get_fourier_coeff_fft, FFT_MODE_GAUSS, FFT_MODE_UNIFORM,
+                         fourier_eval, get_fourier_vector_line, get_fourier_data)
+
+
+# coefficient engines besides the IS methods (see bench_coefficients)
+ENGINE_FFT_GAUSS = "fft-" + FFT_MODE_GAUSS
+ENGINE_FFT_UNIFORM = "fft-" + FFT_MODE_UNIFORM
+ENGINE_PARALLEL = "parallel"
+
+
+def _time_call(func, repeat=3):
+    '''
+    Returns
+    -------
+    Dict with the best and median wall time (seconds) of repeat calls of func
+    '''
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        times += [time.perf_counter() - start_time]
+    return {"best": min(times), "median": float(np.median(times)), "repeat": repeat}
+
+
+
+### benchmarks (every function returns a list of result-dicts) ###
+
+def bench_load(svg_path, repeat=3):
+    results = [dict(benchmark="svg_load", **_time_call(lambda: SVG_Handler(svg_path), repeat))]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        compiled_path = os.path.join(tmp_dir, "curve.npz")
+        SVG_Handler(svg_path).export_compiled(compiled_path)
+        results += [dict(benchmark="compiled_load", **_time_call(lambda: SVG_Handler.from_compiled(compiled_path), repeat))]
+    return results
+
+
+def bench_get_point(handler, n_points=100000, n_single=2000, repeat=3):
+    t_vector = np.linspace(0, 1, n_points)
+    t_single = np.linspace(0, 1, n_single)
+    vector_timing = _time_call(lambda: handler.get_point(t_vector, reverse=True), repeat)
+    single_timing = _time_call(lambda: [handler._single_points(t, True) for t in t_single], repeat)
+    return [dict(benchmark="get_point", params={"n_points": n_points}, points_per_sec=n_points/vector_timing["best"], **vector_timing),
+            dict(benchmark="get_point_single", params={"n_points": n_single}, points_per_sec=n_single/single_timing["best"], **single_timing)]
+
+
+def bench_coefficients(handler, N_list, engines, n_workers=None, repeat=1):
+    func = lambda t: handler.get_point(t, reverse=True)
+    curve = handler.get_compiled_curve(reverse=True)
+    calculations = {
+        ENGINE_FFT_GAUSS: lambda N: get_fourier_coeff_fft(func, N=N, mode=FFT_MODE_GAUSS),
+        ENGINE_FFT_UNIFORM: lambda N: get_fourier_coeff_fft(func, N=N, mode=FFT_MODE_UNIFORM),
+        ENGINE_PARALLEL: lambda N: get_fourier_coeff_parallel(curve, N=N, n_workers=n_workers),
+    }
+    results = []
+    for engine in engines:
+        for N in N_list:
+            if engine in calculations:
+                calc = lambda: calculations[engine](N)
+            else: # method string of IS
+                calc = lambda: get_fourier_coeff(func, N=N, method_string=engine)
+            results += [dict(benchmark="coefficients", params={"engine": engine, "N": N}, **_time_call(calc, repeat))]
+    return results
+
+
+def bench_eval(ind, coeff, n_eval=3000, repeat=3):
+    t_uniform = np.linspace(0, 1, n_eval, endpoint=False) # the step divides the period --> inverse fft
+    t_random = np.sort(np.random.default_rng(0).random(n_eval)) # general points --> matrix product
+    return [dict(benchmark="fourier_eval", params={"grid": "uniform", "n_eval": n_eval, "N": len(coeff)//2},
+                 **_time_call(lambda: fourier_eval(ind, coeff, t_uniform), repeat)),
+            dict(benchmark="fourier_eval", params={"grid": "random", "n_eval": n_eval, "N": len(coeff)//2},
+                 **_time_call(lambda: fourier_eval(ind, coeff, t_random), repeat))]
+
+
+def bench_frames(ind, coeff, n_eval=3000, n_single=200, repeat=3):
+    t_eval = np.linspace(0, 1, n_eval)
+    single_timing = _time_call(lambda: [get_fourier_vector_line(t, coeff, ind) for t in t_eval[:n_single]], repeat)
+    data_timing = _time_call(lambda: get_fourier_data(t_eval, coeff, ind), repeat)
+    return [dict(benchmark="get_fourier_vector_line", params={"frames": n_single, "N": len(coeff)//2},
+                 frames_per_sec=n_single/single_timing["best"], **single_timing),
+            dict(benchmark="get_fourier_data", params={"frames": n_eval, "N": len(coeff)//2},
+                 frames_per_sec=n_eval/data_timing["best"], **data_timing)]
+
+
+def bench_render(ind, coeff, n_frames=50, fps=25):
+    '''
+    Saves an animation with n_frames frames once with matplotlib (ffmpeg or, without ffmpeg, a gif with pillow)
+    and once with the raw renderer (only with ffmpeg).
+    '''
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+    from animation import fourier_animation
+    from raw_renderer import save_raw_video
+
+    t_eval = np.linspace(0, 1, n_frames)
+    fourier_evaluated = fourier_eval(ind, coeff, t_eval)
+    figure_data = np.stack((np.real(fourier_evaluated), -np.imag(fourier_evaluated)), axis=-1)
+    fourier_data = get_fourier_data(t_eval, coeff, ind)
+    has_ffmpeg = not shutil.which("ffmpeg") is None
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        anim = fourier_animation(figure_data, fourier_data, animation_time=n_frames/fps, fast_render=True, show=False)
+        if has_ffmpeg:
+            writer, output = animation.writers['ffmpeg'](fps=fps, bitrate=30000), os.path.join(tmp_dir, "matplotlib.mp4")
+        else:
+            writer, output = animation.PillowWriter(fps=fps), os.path.join(tmp_dir, "matplotlib.gif")
+        timing = _time_call(lambda: anim.save(output, writer=writer), 1)
+        plt.close("all")
+        results += [dict(benchmark="animation_save", params={"writer": type(writer).__name__, "frames": n_frames, "N": len(coeff)//2},
+                         frames_per_sec=n_frames/timing["best"], **timing)]
+
+        if has_ffmpeg:
+            output = os.path.join(tmp_dir, "raw.mp4")
+            timing = _time_call(lambda: save_raw_video(figure_data, fourier_data, output, animation_time=n_frames/fps, fps=fps), 1)
+            results += [dict(benchmark="raw_video_save", params={"frames": n_frames, "N": len(coeff)//2},
+                             frames_per_sec=n_frames/timing["best"], **timing)]
+        else:
+            results += [dict(benchmark="raw_video_save", params={"frames": n_frames, "N": len(coeff)//2}, skipped="ffmpeg not found")]
+    return results
+
+
+
+# code of the cold start benchmark: only the coefficients (and their export) or the whole animation
+COLD_START_CODE = {
+    "coefficients": "import fourier_series, svg_handler",
+    "animation": "import FourierMain, animation",
+}
+
+def bench_cold_start(repeat=3):
+    '''
+    Time of a new python process that imports the modules of COLD_START_CODE (includes the start of the interpreter itself).
+    '''
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for path, code in [("interpreter", "pass")] + list(COLD_START_CODE.items()):
+        timing = _time_call(lambda: subprocess.run([sys.executable, "-c", code], cwd=package_dir, check=True), repeat)
+        results += [dict(benchmark="cold_start", params={"path": path}, **timing)]
+    return results
+
+
+
+### suite ###
+
+def _get_environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {"python": sys.version.split()[0], "numpy": np.__version__, "platform": platform.platform(),
+            "processor": platform.processor(), "cpu_count": os.cpu_count(), "commit": commit or None,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def run_benchmarks(pattern="images/*.svg", N_list=(20, 80, 160), engines=None, n_eval=3000, render=True, n_render_frames=50,
+                   n_workers=None, repeat=3):
+    '''
+    Runs every benchmark for every svg-file of pattern.
+
+    Parameters
+    ----------
+    N_list : number of coefficients (sweep) for the coefficient benchmarks, the other benchmarks use the largest N
+    engines : IS method strings and ENGINE_... (None uses all of them, the parallel engine only with n_workers > 1)
+    render : False skips saving animations (slowest part)
+    repeat : number of repetitions (the coefficient benchmarks and saving are done only once)
+
+    Returns
+    -------
+    Dict with the environment and a list of results (times in seconds)
+    '''
+    if engines is None:
+        engines = list(IS.get_all_method_strings()) + [ENGINE_FFT_GAUSS, ENGINE_FFT_UNIFORM] + ([ENGINE_PARALLEL] if (n_workers or 1) > 1 else [])
+
+    results = [dict(result, image=None, functions=None) for result in bench_cold_start(repeat)]
+    for svg_path in sorted(glob.glob(pattern)):
+        print(f"Benchmark {svg_path}")
+        handler = SVG_Handler(svg_path)
+        image_results = bench_load(svg_path, repeat)
+        image_results += bench_get_point(handler, repeat=repeat)
+        image_results += bench_coefficients(handler, N_list, engines, n_workers=n_workers)
+
+        ind, coeff = get_fourier_coeff_fft(lambda t: handler.get_point(t, reverse=True), N=max(N_list))
+        image_results += bench_eval(ind, coeff, n_eval, repeat)
+        image_results += bench_frames(ind, coeff, n_eval, repeat=repeat)
+        if render:
+            image_results += bench_render(ind, coeff, n_frames=n_render_frames)
+
+        for result in image_results:
+            result.update(image=os.path.basename(svg_path), functions=handler.line_count)
+        results += image_results
+
+    return {"environment": _get_environment(), "results": results}
+
+
+def _get_result_key(result):
+    return (result["image"], result["benchmark"], json.dumps(result.get("params", {}), sort_keys=True))
+
+
+def compare(baseline, current, threshold=1.2):
+    '''
+    Compares two reports of run_benchmarks (same benchmarks are matched by image, name and parameters).
+
+    Returns
+    -------
+    List of (key, baseline time, current time, ratio) of all benchmarks that are more than threshold times slower
+    '''
+    baseline_times = {_get_result_key(result): result["best"] for result in baseline["results"] if "best" in result}
+    regressions = []
+    for result in current["results"]:
+        key = _get_result_key(result)
+        if key in baseline_times and "best" in result:
+            ratio = result["best"] / max(baseline_times[key], 1e-12)
+            if ratio > threshold:
+                regressions += [(key, baseline_times[key], result["best"], ratio)]
+    return regressions
+
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the whole pipeline (svg loading, coefficients, evaluation, frames, rendering).")
+    parser.add_argument("pattern", nargs="?", default="images/*.svg", help="glob of svg-files")
+    parser.add_argument("--N", type=int, nargs="+", default=[20, 80, 160], help="number of coefficients (sweep)")
+    parser.add_argument("--engines", nargs="+", default=None, help=f"IS method strings, {ENGINE_FFT_GAUSS}, {ENGINE_FFT_UNIFORM} or {ENGINE_PARALLEL}")
+    parser.add_argument("--n-eval", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=None, help="processes of the parallel engine")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-render", action="store_true", help="skips saving animations")
+    parser.add_argument("--render-frames", type=int, default=50)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", default=None, help="report of an earlier run, slower benchmarks are listed (exit code 1)")
+    parser.add_argument("--threshold", type=float, default=1.2, help="ratio of the times that counts as regression")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.pattern, args.N, args.engines, args.n_eval, not args.no_render, args.render_frames, args.workers, args.repeat)
+    with open(args.output, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"{len(report['results'])} results written to {args.output}")
+
+    if not args.compare is None:
+        with open(args.compare) as baseline_file:
+            regressions = compare(json.load(baseline_file), report, args.threshold)
+        for (image, benchmark, params), old_time, new_time, ratio in regressions:
+            print(f"{image} {benchmark} {params}: {old_time:.4g}s -> {new_time:.4g}s ({ratio:.2f}x)")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,189 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+import os
+import json
+import hashlib
+import numpy as np
+
+from svg_handler import SVG_Handler
+from fourier_series import FFT_MODE_GAUSS, METHOD_FFT
+
+
+def get_coeff_params(N, T, reverse, parametrization, method=METHOD_FFT, fft_mode=FFT_MODE_GAUSS, oversampling=4, n_steps=200, n_gauss_param=6,
+                     sort_functions=SVG_Handler.SORT_AUTO, two_opt_time=0.0, arc_samples=32):
+    '''
+    Parameters
+    ----------
+    N, T, reverse : see get_fourier_coeff (N=None for an entry of CoefficientCache.get_growing_coeff, that holds every N)
+    parametrization, sort_functions, two_opt_time, arc_samples : see SVG_Handler (the defaults are the ones of load_handler)
+    method : METHOD_FFT (get_fourier_coeff_fft) or the method_string of get_fourier_coeff (same for get_fourier_coeff_parallel)
+    fft_mode, oversampling : see get_fourier_coeff_fft (only used with METHOD_FFT)
+    n_steps, n_gauss_param : quadrature
+
+    Returns
+    -------
+    Dict with every option that changes the coefficients of a curve, the params of CoefficientCache.get_key
+    (the same key for FourierMain.main, batch_render and render_service)
+    '''
+    params = dict(T=list(T), reverse=reverse, parametrization=parametrization, sort_functions=sort_functions, two_opt_time=two_opt_time,
+                  arc_samples=arc_samples, method=method, n_steps=n_steps, n_gauss_param=n_gauss_param)
+    if method == METHOD_FFT:
+        params.update(fft_mode=fft_mode, oversampling=oversampling)
+    if not N is None:
+        params["N"] = N
+    return params
+
+
+
+def evict_lru(directory, max_size, extension, keep=()):
+    '''
+    Deletes the least recently used files (oldest modification time, see os.utime) with the given extension
+    until they fit into max_size bytes (files ending with ".tmp" + extension are still being written and ignored).
+    The file names in keep are never deleted (for example files that are in use), but their size counts.
+    '''
+    entries, total_size = [], 0
+    for name in os.listdir(directory):
+        if name.endswith(extension) and not name.endswith(".tmp" + extension):
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except FileNotFoundError: # already evicted by another process
+                continue
+            total_size += stat.st_size
+            if not name in keep:
+                entries += [(stat.st_mtime, stat.st_size, name)]
+
+    for _, size, name in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError: # already evicted by another process
+            pass
+        total_size -= size
+
+
+
+class CoefficientCache():
+
+    def __init__(self, cache_dir=".fourier_cache", max_size_mb=256):
+        '''
+        Parameters
+        ----------
+        cache_dir   : directory for the cached coefficients (one .npz file per entry)
+        max_size_mb : if the directory gets larger, the least recently used entries are deleted
+        '''
+        self.cache_dir, self.max_size = cache_dir, max_size_mb * 2**20
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+
+    @staticmethod
+    def get_key(svg_path, **params):
+        '''
+        Returns
+        -------
+        String that identifies the content of the svg file together with all parameters of the calculation
+        (see get_coeff_params)
+        '''
+        key_hash = hashlib.sha256()
+        with open(svg_path, "rb") as svg_file:
+            for block in iter(lambda: svg_file.read(2**20), b""):
+                key_hash.update(block)
+        key_hash.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return key_hash.hexdigest()
+
+
+    def _get_file(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+
+    def load(self, key): # returns (indizes, coeff) or None if the key is not cached
+        file_path = self._get_file(key)
+        if not os.path.isfile(file_path):
+            return None
+
+        with np.load(file_path) as data:
+            ind, coeff = data["ind"], data["coeff"]
+        os.utime(file_path) # marks the entry as recently used
+        return ind, coeff
+
+
+    def save(self, key, ind, coeff):
+        file_path = self._get_file(key)
+        tmp_path = file_path + ".tmp.npz"
+        np.savez(tmp_path, ind=ind, coeff=coeff)
+        os.replace(tmp_path, file_path) # no half written entries if several processes use the same cache
+        self._evict()
+
+
+    def _evict(self):
+        evict_lru(self.cache_dir, self.max_size, ".npz")
+
+
+    def get_fourier_coeff(self, svg_path, calc_coeff, **params):
+        '''
+        Parameters
+        ----------
+        svg_path   : path of the svg file the coefficients belong to
+        calc_coeff : callable without parameters, returns (indizes, coeff), only called if nothing is cached
+        params     : every parameter that changes the coefficients (see get_coeff_params)
+
+        Returns
+        -------
+        indizes, coeff : same as get_fourier_coeff
+        '''
+        key = self.get_key(svg_path, **params)
+        cached = self.load(key)
+        if not cached is None:
+            return cached
+
+        ind, coeff = calc_coeff()
+        self.save(key, ind, coeff)
+        return ind, coeff
+
+
+    def get_growing_coeff(self, svg_path, N, calc_coeff, make_store, **params):
+        '''
+        Same as get_fourier_coeff, but one entry holds the coefficients of the largest N so far (params without N):
+        a smaller N is a slice of it, a larger N only calculates the new indizes.
+
+        Parameters
+        ----------
+        N          : coefficients from k=-N up to k=N
+        calc_coeff : callable without parameters, returns (indizes, coeff) of N, only called if nothing is cached
+        make_store : callable without parameters, returns a CoefficientStore with the same parameters (extends a cached smaller N)
+
+        Returns
+        -------
+        indizes, coeff : same as get_fourier_coeff
+        '''
+        assert not "N" in params, "The entry has to hold every N"
+        key = self.get_key(svg_path, **params)
+        cached = self.load(key)
+        if not cached is None and cached[0].shape[0] >= 2*N+1: # smaller N: slice
+            cut = (cached[0].shape[0] - (2*N+1)) // 2
+            return cached[0][cut:cached[0].shape[0]-cut], cached[1][cut:cached[1].shape[0]-cut]
+
+        if cached is None:
+            ind, coeff = calc_coeff()
+        else:
+            store = make_store()
+            store.add_known(*cached)
+            ind, coeff = store.get_fourier_coeff(N)
+        self.save(key, ind, coeff)
+        return ind, coeff
@@ -0,0 +1,119 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+import numpy as np
+
+from fourier_series import fourier_eval, get_fourier_data_chunks, get_fourier_latex, get_desmos_string
+
+
+class FourierCoefficientSet():
+
+    def __init__(self, ind, coeff, period=1, error_bound=0.0, rms_error=0.0):
+        '''
+        Terms of a fourier series sorted by descending absolute value (sorted only once), so that pruning is just a slice
+        and the frames need no further sorting.
+
+        Parameters
+        ----------
+        ind, coeff : indizes and coefficients (any order), for example from get_fourier_coeff
+        period : period of the series
+        error_bound, rms_error : error of the terms that were already dropped (see prune)
+        '''
+        ind, coeff = np.asarray(ind), np.asarray(coeff)
+        new_indizes = np.argsort(-np.abs(coeff), kind="stable")
+        self.ind, self.coeff, self.period = ind[new_indizes], coeff[new_indizes], period
+        self.error_bound, self.rms_error = error_bound, rms_error
+
+
+    def __len__(self):
+        return self.coeff.shape[0]
+
+
+    @property
+    def energy(self): # sum of |c_k|^2
+        return float(np.sum(np.abs(self.coeff)**2))
+
+
+    def get_keep_count(self, energy_fraction=None, max_error=None, max_terms=None):
+        '''
+        Returns
+        -------
+        Smallest number of (largest) terms that satisfies every given condition
+        energy_fraction : kept terms hold at least this fraction of the energy (for example 0.9999)
+        max_error : sum of |c_k| of the dropped terms (bound for the error of every point of the series) is at most max_error
+        max_terms : at most max_terms terms
+        '''
+        magnitudes = np.abs(self.coeff)
+        keep = len(self)
+        if not energy_fraction is None:
+            kept_energy = np.cumsum(magnitudes**2)
+            keep = min(keep, int(np.searchsorted(kept_energy, energy_fraction * kept_energy[-1] * (1 - 1e-12))) + 1)
+        if not max_error is None:
+            dropped = np.concatenate((np.cumsum(magnitudes[::-1])[::-1], [0])) # dropped[n] = error of keeping n terms
+            keep = min(keep, int(np.argmax(dropped <= max_error)))
+        if not max_terms is None:
+            keep = min(keep, max_terms)
+        return max(keep, 0)
+
+
+    def prune(self, energy_fraction=None, max_error=None, max_terms=None):
+        '''
+        Drops the smallest terms, see get_keep_count for the parameters.
+
+        Returns
+        -------
+        New FourierCoefficientSet, its error_bound (largest deviation of a point) and rms_error (mean deviation over one period,
+        Parseval) include the dropped terms
+        '''
+        keep = self.get_keep_count(energy_fraction, max_error, max_terms)
+        dropped = self.coeff[keep:]
+        pruned = FourierCoefficientSet.__new__(FourierCoefficientSet) # already sorted
+        pruned.ind, pruned.coeff, pruned.period = self.ind[:keep], self.coeff[:keep], self.period
+        pruned.error_bound = self.error_bound + float(np.sum(np.abs(dropped)))
+        pruned.rms_error = float(np.sqrt(self.rms_error**2 + np.sum(np.abs(dropped)**2)))
+        return pruned
+
+
+    def get_by_index(self): # ind, coeff sorted by index (for example for the latex output)
+        new_indizes = np.argsort(self.ind, kind="stable")
+        return self.ind[new_indizes], self.coeff[new_indizes]
+
+
+    def evaluate(self, t_eval):
+        return fourier_eval(self.ind, self.coeff, t_eval, period=self.period)
+
+
+    def get_fourier_data_chunks(self, t_eval, max_chunk_mb=64): # see get_fourier_data_chunks, one point per kept term
+        return get_fourier_data_chunks(t_eval, self.coeff, self.ind, period=self.period, max_chunk_mb=max_chunk_mb, presorted=True)
+
+
+    def get_fourier_data(self, t_eval, max_chunk_mb=64):
+        out = np.empty((len(t_eval), len(self)+1, 2))
+        for start, chunk in self.get_fourier_data_chunks(t_eval, max_chunk_mb):
+            out[start:start+chunk.shape[0]] = chunk
+        return out
+
+
+    def get_latex(self, coeff_per_line=4):
+        ind, coeff = self.get_by_index()
+        return get_fourier_latex(coeff, ind, coeff_per_line)
+
+
+    def get_desmos_string(self):
+        ind, coeff = self.get_by_index()
+        return get_desmos_string(coeff, ind, threshold=0)
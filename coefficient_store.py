@@ -0,0 +1,123 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+import numpy as np
+
+from integral_solver import IS
+from fourier_series import fourier_eval, METHOD_FFT, _get_gauss_spectra, _get_gauss_fft_coeff
+
+
+class CoefficientStore():
+
+    def __init__(self, func, T=[0, 1], method_string=IS.Z_GAUSS_QUAD, n_steps=200, n_gauss_param=6):
+        '''
+        Samples func once on the quadrature grid and keeps every coefficient calculated so far,
+        so that a larger N only needs the new indizes and a smaller N is just a slice.
+
+        Parameters
+        ----------
+        func : vectorized callable (for example lambda t: handler.get_point(t, reverse=...))
+        T : [left, right] boundaries (one period)
+        method_string, n_steps, n_gauss_param : quadrature of the coefficients (see IS and get_fourier_coeff), or
+                                                METHOD_FFT for get_fourier_coeff_fft with FFT_MODE_GAUSS.
+                                                Not possible: IS.Z_ADAPTIVE_GK and FFT_MODE_UNIFORM, their nodes depend on
+                                                the indizes (refinement, number of samples), so known coefficients can not be kept.
+        '''
+        self.func, self.T, self.period = func, T, T[1] - T[0]
+
+        self.method_string = method_string
+        if method_string == METHOD_FFT:
+            self.spectra = _get_gauss_spectra(func, T, n_steps, n_gauss_param) # every index is a sum over one row of the spectra
+        else:
+            self.nodes, weights = IS(func, T, method_string=method_string).get_nodes_weights(n_steps, n_gauss_param)
+            self.weighted_values = weights * np.asarray(func(self.nodes), dtype=complex)
+
+        self.N = -1 # coefficients from -N up to N are known
+        self.coeff = np.empty(0, dtype=complex)
+
+
+    def _calc_coeff(self, indizes): # same integrals as get_fourier_coeff (or get_fourier_coeff_fft), but only for the given indizes
+        if self.method_string == METHOD_FFT:
+            return _get_gauss_fft_coeff(indizes, *self.spectra, self.T)
+        kernel = np.exp(2j*np.pi/self.period * np.outer(indizes, self.nodes))
+        return kernel @ self.weighted_values
+
+
+    def add_known(self, ind, coeff):
+        '''
+        Adds coefficients that were calculated before with the same parameters (for example from the CoefficientCache),
+        ind has to be -N, ..., N. Only indizes with |k| > N are calculated afterwards.
+        '''
+        N = (len(ind) - 1) // 2
+        assert np.array_equal(ind, np.arange(-N, N+1)), "The known coefficients have to be sorted from -N up to N"
+        if N > self.N:
+            self.N, self.coeff = N, np.asarray(coeff, dtype=complex)
+
+
+    def get_fourier_coeff(self, N):
+        '''
+        Returns
+        -------
+        indizes, coeff : same as get_fourier_coeff(func, T, N), only the indizes with N_old < |k| <= N are calculated
+        '''
+        if N > self.N:
+            if self.N < 0: # nothing known yet
+                self.coeff = self._calc_coeff(np.arange(-N, N+1))
+            else:
+                self.coeff = np.concatenate((self._calc_coeff(np.arange(-N, -self.N)), self.coeff,
+                                             self._calc_coeff(np.arange(self.N+1, N+1))))
+            self.N = N
+
+        cut = self.N - N
+        return np.arange(-N, N+1), self.coeff[cut:self.coeff.shape[0]-cut].copy()
+
+
+    def get_error(self, N, n_check=2000, norm="rms"):
+        '''
+        Returns
+        -------
+        Reconstruction error of the series with N coefficients against func on n_check points
+        ("rms" or "max" norm)
+        '''
+        t_check = self.T[0] + (np.arange(n_check) + 0.5) * self.period / n_check
+        ind, coeff = self.get_fourier_coeff(N)
+
+        # the coefficients use exp(+2 pi i k t), so the series with negative indizes reconstructs func itself
+        difference = fourier_eval(-ind, coeff, t_check, period=self.period) / self.period - np.asarray(self.func(t_check))
+        if norm == "max":
+            return np.amax(np.abs(difference))
+        return np.sqrt(np.mean(np.abs(difference)**2))
+
+
+    def refine_to_error(self, target_error, N_start=8, N_max=2000, growth=1.5, n_check=2000, norm="rms"):
+        '''
+        Adds coefficients (N grows by the factor growth) until the reconstruction error is below target_error or N_max is reached.
+
+        Returns
+        -------
+        indizes, coeff, error
+        '''
+        N = N_start
+        while True:
+            error = self.get_error(N, n_check=n_check, norm=norm)
+            if error <= target_error or N >= N_max:
+                break
+            N = min(N_max, int(np.ceil(N * growth)))
+
+        ind, coeff = self.get_fourier_coeff(N)
+        return ind, coeff, error
@@ -0,0 +1,347 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+
+### Libraries ###
+import numpy as np
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+
+### My own imports ###
+from integral_solver import IS # solve the integrals
+import instrumentation # stage timings (enabled with the environment variable FOURIER_TRACE)
+
+
+# Everything needed to calculate, evaluate and export the fourier series (no matplotlib, no svgpathtools),
+# FourierMain imports all of it for the animation.
+
+
+COEFF_CHUNK_SIZE = 64 # indizes per kernel matrix (get_fourier_coeff) and per task (get_fourier_coeff_parallel), same value --> same result
+
+def _get_breakpoints(func, method_string): # segment boundaries of a CompiledCurve (kinks and jumps) for the adaptive quadrature
+    if method_string == IS.Z_ADAPTIVE_GK and hasattr(func, "get_segment_boundaries"):
+        return func.get_segment_boundaries(reverse=func.reverse)
+    return None
+
+
+@instrumentation.timed()
+def get_fourier_coeff(func, T=[0, 1], N=4, method_string=IS.Z_GAUSS_QUAD, n_steps=200, n_gauss_param=6, tolerance=IS.ADAPTIVE_TOLERANCE,
+                      breakpoints=None, chunk_size=COEFF_CHUNK_SIZE):
+    '''
+    breakpoints : only IS.Z_ADAPTIVE_GK, None uses the segment boundaries if func is a CompiledCurve (handler.get_compiled_curve)
+    '''
+    indizes = np.arange(-N, N+1)
+    if breakpoints is None:
+        breakpoints = _get_breakpoints(func, method_string)
+    
+    period = T[1] - T[0]
+    solver = IS(func, T, method_string=method_string) # func is evaluated only once, the exp kernel is applied for all indizes
+    coeff = solver.get_batch_approximation(n_steps, frequencies=indizes/period, n_gauss_param=n_gauss_param, chunk_size=chunk_size,
+                                           tolerance=tolerance, breakpoints=breakpoints) # tolerance and breakpoints only for IS.Z_ADAPTIVE_GK
+    
+    return indizes, coeff
+
+
+def _fourier_coeff_chunk(func, T, indizes, method_string, n_steps, n_gauss_param, tolerance, breakpoints): # one chunk of get_fourier_coeff
+    solver = IS(func, T, method_string=method_string)
+    return solver.get_batch_approximation(n_steps, frequencies=indizes/(T[1] - T[0]), n_gauss_param=n_gauss_param, chunk_size=indizes.shape[0],
+                                          tolerance=tolerance, breakpoints=breakpoints)
+
+
+_worker_func = None # func of a worker process of get_fourier_coeff_parallel (pickled once per process, not once per chunk)
+
+def _init_worker(func):
+    global _worker_func
+    _worker_func = func
+
+
+def _fourier_coeff_worker_chunk(*args): # work of one process
+    return _fourier_coeff_chunk(_worker_func, *args)
+
+
+@instrumentation.timed()
+def get_fourier_coeff_parallel(func, T=[0, 1], N=4, n_workers=None, chunk_size=COEFF_CHUNK_SIZE, method_string=IS.Z_GAUSS_QUAD, n_steps=200, n_gauss_param=6,
+                               tolerance=IS.ADAPTIVE_TOLERANCE, breakpoints=None):
+    '''
+    Same as get_fourier_coeff, but the indizes are split into chunks that are calculated by a pool of processes.
+    The chunks are the kernel matrices of get_fourier_coeff, so the result is identical to get_fourier_coeff with the same chunk_size.
+
+    Parameters
+    ----------
+    func : picklable callable (no lambda), for example handler.get_compiled_curve(reverse=...), it is sent once to every process
+    n_workers : number of processes, None uses every core. With n_workers=1 the chunks are calculated in this process
+                (serial path), the result is identical for every number of workers.
+    chunk_size : number of indizes per task
+    '''
+    indizes = np.arange(-N, N+1)
+    if breakpoints is None:
+        breakpoints = _get_breakpoints(func, method_string)
+    chunks = [indizes[i:i+chunk_size] for i in range(0, indizes.shape[0], chunk_size)]
+    chunk_args = (repeat(T), chunks, repeat(method_string), repeat(n_steps), repeat(n_gauss_param), repeat(tolerance), repeat(breakpoints))
+    
+    if n_workers == 1:
+        results = list(map(_fourier_coeff_chunk, repeat(func), *chunk_args))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(func,)) as pool:
+            results = list(pool.map(_fourier_coeff_worker_chunk, *chunk_args))
+    
+    return indizes, np.concatenate(results)
+
+
+# accuracy modes of get_fourier_coeff_fft
+FFT_MODE_GAUSS = "gauss" # same nodes and weights as the chained Gauß quadrature in get_fourier_coeff
+FFT_MODE_UNIFORM = "uniform" # (periodic) trapezoidal rule on an equidistant grid, fewer samples needed
+METHOD_FFT = "fft" # get_fourier_coeff_fft instead of a method_string of get_fourier_coeff (for example in CoefficientStore)
+
+
+def _get_gauss_spectra(func, T, n_steps, n_gauss_param): # FFT_MODE_GAUSS: samples func once, returns (spectra, offsets, weights)
+    h = (T[1] - T[0]) / n_steps
+    nodes, weights = IS.get_gauss_legendre(n_gauss_param)
+    offsets = h/2 * (1 + nodes) # position of the gauss nodes inside every subinterval
+
+    t_sample = T[0] + h*np.arange(n_steps)[:,np.newaxis] + offsets[np.newaxis,:] # shape (n_steps, n_gauss_param)
+    values = np.asarray(func(t_sample.ravel()), dtype=complex).reshape(t_sample.shape)
+    instrumentation.count("get_fourier_coeff_fft.func_points", t_sample.size)
+
+    # sum_m f(a_m + o_q) * exp(2 pi i k m / n_steps) for every node q, evaluated for all k at once
+    return n_steps * np.fft.ifft(values, axis=0), offsets, weights
+
+
+def _get_gauss_fft_coeff(indizes, spectra, offsets, weights, T): # coefficients of the given indizes from _get_gauss_spectra
+    n_steps, period = spectra.shape[0], T[1] - T[0]
+    phase = np.exp(2j*np.pi/period * np.outer(indizes, T[0] + offsets))
+    return period / n_steps / 2 * np.sum(weights * phase * spectra[indizes % n_steps], axis=1)
+
+
+@instrumentation.timed()
+def get_fourier_coeff_fft(func, T=[0, 1], N=4, mode=FFT_MODE_GAUSS, n_steps=200, n_gauss_param=6, oversampling=4):
+    '''
+    Calculates all coefficients c_k (k=-N,...,N) like get_fourier_coeff, but samples func only once
+    and gets every coefficient from a few FFTs instead of one quadrature per index.
+
+    Parameters
+    ----------
+    func : vectorized callable, gets a numpy array of times inside T
+    T : [left, right] boundaries (one period)
+    N : coefficients from k=-N up to k=N are calculated
+    mode : FFT_MODE_GAUSS reproduces the chained Gauß quadrature of get_fourier_coeff (n_steps subintervals of order
+           n_gauss_param, one FFT of length n_steps per Gauß node). FFT_MODE_UNIFORM uses the trapezoidal rule on
+           max(n_steps, oversampling*(2N+1)) equidistant points (exact for trigonometric polynomials of that degree).
+    n_steps : number of subintervals (FFT length)
+    n_gauss_param : order of the Gauß quadrature per subinterval (only used in FFT_MODE_GAUSS)
+    oversampling : samples per coefficient (only used in FFT_MODE_UNIFORM)
+
+    Returns
+    -------
+    indizes, coeff : same as get_fourier_coeff
+    '''
+    indizes = np.arange(-N, N+1)
+    period = T[1] - T[0]
+
+    if mode == FFT_MODE_GAUSS:
+        coeff = _get_gauss_fft_coeff(indizes, *_get_gauss_spectra(func, T, n_steps, n_gauss_param), T)
+
+    elif mode == FFT_MODE_UNIFORM:
+        n_samples = max(n_steps, oversampling*(2*N+1))
+        t_sample, h = np.linspace(T[0], T[1], n_samples + 1, retstep=True)
+        values = np.asarray(func(t_sample), dtype=complex)
+        instrumentation.count("get_fourier_coeff_fft.func_points", t_sample.size)
+        values[0] = (values[0] + values[-1]) / 2 # trapezoidal rule: both ends share the first sample
+
+        spectra = n_samples * np.fft.ifft(values[:-1])[indizes % n_samples]
+        coeff = h * np.exp(2j*np.pi/period * indizes * T[0]) * spectra
+
+    else:
+        assert False, "FFT mode does not exist!"
+
+    return indizes, coeff
+
+
+def _get_uniform_step(t_eval, period): # returns the step width if t_eval is an equidistant grid, otherwise None
+    if t_eval.shape[0] < 2:
+        return None
+    step = (t_eval[-1] - t_eval[0]) / (t_eval.shape[0] - 1)
+    if step == 0:
+        return None
+    
+    tolerance = 1e-10 * max(abs(period), np.amax(np.abs(t_eval[[0, -1]])))
+    for start in range(0, t_eval.shape[0], 2**16): # check chunk by chunk, no second array of full length is needed
+        grid = t_eval[0] + step * np.arange(start, min(start + 2**16, t_eval.shape[0]))
+        if np.amax(np.abs(t_eval[start:start+grid.shape[0]] - grid)) > tolerance:
+            return None
+    return step
+
+
+def fourier_eval_chunks(ind, coeff, t_eval, period=1, chunk_size=2**14):
+    '''
+    Generator that evaluates the fourier series for t_eval in chunks of at most chunk_size points, so that
+    only one chunk (and a chunk_size x len(coeff) kernel) is in memory at any time.
+    On an equidistant grid the kernel is calculated only once and then shifted for every chunk.
+
+    Yields
+    ------
+    start, values : values of the series at t_eval[start:start+len(values)]
+    '''
+    t_eval = np.asarray(t_eval, dtype=float)
+    coeff = np.asarray(coeff)
+    step = _get_uniform_step(t_eval, period)
+    
+    if not step is None:
+        kernel = np.exp(2j*np.pi/period * np.outer(step * np.arange(min(chunk_size, t_eval.shape[0])), ind))
+    
+    for start in range(0, t_eval.shape[0], chunk_size):
+        t_chunk = t_eval[start:start+chunk_size]
+        if step is None:
+            yield start, np.exp(2j*np.pi/period * np.outer(t_chunk, ind)) @ coeff
+        else:
+            shifted_coeff = coeff * np.exp(2j*np.pi/period * np.asarray(ind) * t_chunk[0])
+            yield start, kernel[:t_chunk.shape[0]] @ shifted_coeff
+
+
+@instrumentation.timed()
+def fourier_eval(ind, coeff, t_eval, period=1, chunk_size=2**14):
+    if isinstance(t_eval, float) or isinstance(t_eval, int):
+        return np.dot(coeff, np.exp(2j*np.pi/period * np.asarray(ind) * t_eval))
+        
+    ### otherwise, it must be a list... ###
+    t_eval = np.asarray(t_eval, dtype=float)
+    ret_values = np.zeros(t_eval.shape, dtype=complex)
+    
+    # equidistant grid with a step of period/M: all values from one inverse FFT of length M
+    step = _get_uniform_step(t_eval, period)
+    if not step is None:
+        fft_length = abs(period / step)
+        if abs(fft_length - np.round(fft_length)) < 1e-6 and np.round(fft_length) <= 4 * max(t_eval.shape[0], len(coeff)):
+            fft_length = int(np.round(fft_length))
+            t_first = t_eval[0] if step > 0 else t_eval[-1] # a descending grid is the reversed ascending one
+            spectrum = np.zeros(fft_length, dtype=complex)
+            np.add.at(spectrum, np.asarray(ind) % fft_length, coeff * np.exp(2j*np.pi/period * np.asarray(ind) * t_first))
+            values = fft_length * np.fft.ifft(spectrum)[np.arange(t_eval.shape[0]) % fft_length]
+            ret_values[:] = values if step > 0 else values[::-1]
+            return ret_values
+    
+    for start, values in fourier_eval_chunks(ind, coeff, t_eval, period=period, chunk_size=chunk_size):
+        ret_values[start:start+values.shape[0]] = values
+
+    return ret_values
+
+
+def get_fourier_vector_line(t, coeff, ind, period=1):
+    new_indizes = np.argsort(-np.abs(coeff)) # sort absolute value of coeffs backwards --> print "long" vectors first
+    #print(new_indizes)
+    coeff_use = coeff[new_indizes]
+    ind_use = ind[new_indizes]
+    
+    ret_line = np.zeros(len(coeff)+1, dtype=complex) # stores all complex values for the line
+    ret_line[0] = 0
+    for i in range(1, coeff_use.shape[0]+1):
+        ret_line[i] = ret_line[i-1] + coeff_use[i-1] * np.exp(2j*np.pi*ind_use[i-1]/period * t) # much much faster...
+        #ret_line[i] = fourier_eval(ind_use[:i], coeff_use[:i], t)
+    return ret_line
+
+def get_fourier_data_chunks(t_eval, coeff, ind, period=1, max_chunk_mb=64, presorted=False):
+    '''
+    Generator over the "fourier-vector representation" of all times in t_eval (same as get_fourier_vector_line for every t).
+    The coefficients are sorted only once, every chunk is calculated with a broadcasted exp and np.cumsum.
+
+    Parameters
+    ----------
+    t_eval : times of the frames
+    max_chunk_mb : upper bound for the temporary arrays of one chunk in megabytes
+    presorted : True if coeff (and ind) are already sorted by descending absolute value
+
+    Yields
+    ------
+    start, chunk : chunk holds the frames t_eval[start:start+len(chunk)], shape (frames, len(coeff)+1, 2) with x and y coordinates
+    '''
+    if presorted:
+        coeff_use, ind_use = coeff, ind
+    else:
+        new_indizes = np.argsort(-np.abs(coeff)) # sort absolute value of coeffs backwards --> print "long" vectors first
+        coeff_use = coeff[new_indizes]
+        ind_use = ind[new_indizes]
+    
+    t_eval = np.asarray(t_eval)
+    bytes_per_frame = 4 * 16 * (len(coeff)+1) # a few complex temporaries per frame
+    chunk_size = max(1, int(max_chunk_mb * 2**20 // bytes_per_frame))
+    
+    for start in range(0, t_eval.shape[0], chunk_size):
+        t_chunk = t_eval[start:start+chunk_size]
+        lines = np.zeros((t_chunk.shape[0], len(coeff)+1), dtype=complex)
+        lines[:,1:] = coeff_use * np.exp(2j*np.pi/period * np.outer(t_chunk, ind_use))
+        np.cumsum(lines, axis=1, out=lines)
+        
+        chunk = np.empty(lines.shape + (2,))
+        chunk[...,0] = np.real(lines) # x coordinates
+        chunk[...,1] = -np.imag(lines) # y coordinates
+        instrumentation.count("frames", chunk.shape[0])
+        yield start, chunk
+
+
+@instrumentation.timed()
+def get_fourier_data(t_eval, coeff, ind, period=1, max_chunk_mb=64, out=None, presorted=False):
+    '''
+    Returns the tensor of all "fourier-vector representations", shape (len(t_eval), len(coeff)+1, 2).
+    It is built chunk by chunk (see get_fourier_data_chunks), so only the result itself needs more than max_chunk_mb.
+    If out is given, the frames are written into it (for example a preallocated or memory-mapped array).
+    presorted : True if coeff (and ind) are already sorted by descending absolute value
+    '''
+    if out is None:
+        out = np.empty((len(t_eval), len(coeff)+1, 2))
+    for start, chunk in get_fourier_data_chunks(t_eval, coeff, ind, period=period, max_chunk_mb=max_chunk_mb, presorted=presorted):
+        out[start:start+chunk.shape[0]] = chunk
+    return out
+
+
+def get_fourier_latex(coeff, ind, coeff_per_line=4): # returns "formatted" latex code to copy the coefficients
+    ret_str = "{}&{} " + "{:.4f}".format(coeff[0])
+    
+    for i, c in enumerate(coeff[1:]):
+        if (i+1) % coeff_per_line == 0:
+            ret_str += ", " + " \\\\ \n{}&{}" + "{:.4f}".format(c)
+        else:
+            ret_str += ", " +  "{:.4f}".format(c)
+    
+    return ret_str.replace('j', 'i')
+
+def get_desmos_string(coeff, ind, threshold=1e-5): # returns 2D vector with sin and cos-funcs to copy into desmos (parts below threshold are dropped)
+    def num_f(number, sign=False):
+        if sign:
+            return "{:+.5f}".format(number).rstrip('0').rstrip('.')
+        else:
+            return "{:.5f}".format(number).rstrip('0').rstrip('.')
+    
+    real_string = ""
+    imag_string = ""
+    
+    for c, k in zip(coeff, ind):
+        #print(num_f(c.real, sign=True))
+        if np.abs(c.real) > threshold:
+            real_string += f"{num_f(c.real, sign=True)}*cos({2*k}*\\pi*t) "
+            
+            imag_string += f"{num_f(-c.real, sign=True)}*sin({2*k}*\\pi*t) "
+        if np.abs(c.imag) > threshold:
+            real_string += f"{num_f(-c.imag, sign=True)}*sin({2*k}*\\pi*t) "
+            
+            imag_string += f"{num_f(-c.imag, sign=True)}*cos({2*k}*\\pi*t) " # negative sign to "flip" imaginary part (why ever this is necessary)
+            
+    
+    #print(real_string)
+    # just makes the string a bit nicer (I know, the following line does not contain nice Code lol)
+    return f"({real_string} , {imag_string})".replace(" ", "")#.replace("       ", "").replace("     ", "").replace("    ", "").replace("   ", "").replace("  ", "")
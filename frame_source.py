@@ -0,0 +1,132 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from fourier_series import get_fourier_data_chunks
+
+
+class FourierFrameSource():
+
+    def __init__(self, t_eval, coeff, ind, period=1, look_ahead=64, prefetch=True):
+        '''
+        Calculates the "fourier-vector representation" of a frame only when it is requested (can be used as fourier_data
+        of fourier_animation). A background thread calculates the next look_ahead frames in advance.
+
+        Parameters
+        ----------
+        t_eval : times of all frames
+        coeff, ind, period : the fourier series
+        look_ahead : number of frames calculated in advance (the distance between two requested frames is detected automatically)
+        prefetch : False to calculate every frame in the calling thread
+        '''
+        new_indizes = np.argsort(-np.abs(coeff)) # sorted only once, see get_fourier_data_chunks
+        self.coeff, self.ind, self.period = coeff[new_indizes], ind[new_indizes], period
+        self.t_eval = np.asarray(t_eval)
+        self.shape = (self.t_eval.shape[0], len(coeff)+1, 2)
+        self.look_ahead, self.prefetch = look_ahead, prefetch
+        self._closed = False
+        self._start()
+
+
+    def _start(self): # cache, lock and background thread (not pickled)
+        self._frames = OrderedDict() # small cache of calculated frames (index -> frame)
+        self._lock = threading.Lock()
+        self._last_index, self._stride = None, 1
+
+        self._request = None # (first index, stride) the background thread should calculate
+        self._wakeup = threading.Event()
+        if self.prefetch and not self._closed:
+            threading.Thread(target=self._prefetch, daemon=True).start()
+
+
+    def __getstate__(self): # for example for the worker processes of save_raw_video
+        state = dict(self.__dict__)
+        for name in ("_frames", "_lock", "_last_index", "_stride", "_request", "_wakeup"):
+            del state[name]
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._start()
+
+
+    def __len__(self):
+        return self.shape[0]
+
+
+    def _calc_frames(self, indices): # returns index -> frame of the calculated frames (they can already be dropped from the cache)
+        indices = [index for index in indices if 0 <= index < self.shape[0]]
+        frames = {}
+        if len(indices) == 0:
+            return frames
+        for start, chunk in get_fourier_data_chunks(self.t_eval[indices], self.coeff, self.ind, period=self.period, presorted=True):
+            frames.update(zip(indices[start:], chunk))
+            with self._lock:
+                for index, frame in zip(indices[start:], chunk):
+                    self._frames[index] = frame
+                while len(self._frames) > 2 * self.look_ahead + 1:
+                    self._frames.popitem(last=False) # oldest frame
+        return frames
+
+
+    def __getitem__(self, index):
+        with self._lock:
+            frame = self._frames.get(index)
+            if not self._last_index is None and index > self._last_index:
+                self._stride = index - self._last_index
+            self._last_index = index
+
+        if frame is None: # not calculated in advance
+            frame = self._calc_frames([index])[index]
+
+        self._request = (index + self._stride, self._stride)
+        self._wakeup.set()
+        return frame
+
+
+    def _prefetch(self): # background thread
+        while not self._closed:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed or self._request is None:
+                continue
+
+            first, stride = self._request
+            with self._lock:
+                missing = [index for index in range(first, first + stride*self.look_ahead, stride) if not index in self._frames]
+            self._calc_frames(missing)
+
+
+    def close(self): # stops the background thread
+        self._closed = True
+        self._wakeup.set()
+
+
+    @property
+    def bounds(self):
+        '''
+        ((x_min, x_max), (y_min, y_max)) that contains every frame (for the axis limits of the animation) without calculating
+        any frame: every point of a frame is a partial sum of the series, so it is at most sum |c_k| away from the origin
+        '''
+        radius = float(np.sum(np.abs(self.coeff)))
+        return ((-radius, radius), (-radius, radius))
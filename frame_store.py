@@ -0,0 +1,92 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+import os
+import json
+import numpy as np
+
+
+class FrameStore():
+
+    def __init__(self, path, n_frames=None, n_points=None):
+        '''
+        Memory-mapped fourier_data (see fourier_animation) in a .npy file, only the frames that are accessed are loaded into RAM.
+
+        Parameters
+        ----------
+        path : .npy file of the frames, the axis bounds are stored next to it (path + ".json")
+        n_frames, n_points : shape of a new store (frames, points per "fourier vector"),
+                             without them an existing store is opened read-only (also when a store is unpickled, after write)
+        '''
+        self.path = path
+        if n_frames is None:
+            self.frames = np.load(path, mmap_mode="r")
+            with open(self._get_bounds_file()) as bounds_file:
+                self.bounds = tuple(tuple(axis) for axis in json.load(bounds_file))
+        else:
+            self.frames = np.lib.format.open_memmap(path, mode="w+", dtype=float, shape=(n_frames, n_points, 2))
+            self.bounds = None
+
+
+    def __reduce__(self): # pickled as its path (for example for the worker processes of save_raw_video), the frames are mapped again
+        return (FrameStore, (self.path,))
+
+
+    def _get_bounds_file(self):
+        return self.path + ".json"
+
+
+    @property
+    def shape(self):
+        return self.frames.shape
+
+
+    def __len__(self):
+        return self.frames.shape[0]
+
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+
+    def write(self, chunks):
+        '''
+        Writes the frames of a chunk generator (for example get_fourier_data_chunks) and calculates the axis bounds on the way,
+        so the whole data is never in memory at once.
+
+        Parameters
+        ----------
+        chunks : iterable of (start, chunk) with chunk of shape (frames, n_points, 2)
+        '''
+        lower, upper = np.full(2, np.inf), np.full(2, -np.inf)
+        for start, chunk in chunks:
+            self.frames[start:start+chunk.shape[0]] = chunk
+            lower = np.minimum(lower, np.amin(chunk, axis=(0, 1)))
+            upper = np.maximum(upper, np.amax(chunk, axis=(0, 1)))
+        self.frames.flush()
+
+        self.bounds = ((float(lower[0]), float(upper[0])), (float(lower[1]), float(upper[1]))) # ((x_min, x_max), (y_min, y_max))
+        with open(self._get_bounds_file(), "w") as bounds_file:
+            json.dump(self.bounds, bounds_file)
+
+
+    def delete(self): # removes the files of the store
+        del self.frames
+        for file_path in (self.path, self._get_bounds_file()):
+            if os.path.isfile(file_path):
+                os.remove(file_path)
@@ -0,0 +1,219 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+import os
+import json
+import time
+import atexit
+import cProfile
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager
+
+
+# environment variables, so that a run can be traced without changing the code
+ENV_TRACE = "FOURIER_TRACE" # path of the json trace (enables the instrumentation)
+ENV_MEMORY = "FOURIER_TRACE_MEMORY" # "1" records the peak memory of every stage (tracemalloc, slows down the program)
+ENV_PROFILE = "FOURIER_TRACE_PROFILE" # "1" runs cProfile, the statistics are saved next to the trace (path + ".prof")
+
+
+class _Recorder():
+
+    def __init__(self, trace_path=None, memory=False, profile=False):
+        self.trace_path, self.memory = trace_path, memory
+        self.start_time = time.perf_counter()
+        self.events = [] # one dict per finished stage
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local() # stack of the open stages of every thread
+
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.profiler = None
+        if profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+
+    def get_stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+
+
+_recorder = None # None means disabled (every hook returns immediately)
+
+
+def enable(trace_path=None, memory=False, profile=False):
+    '''
+    Starts recording stages and counters (everything recorded before is dropped).
+
+    Parameters
+    ----------
+    trace_path : optional, the trace is exported to this json file when the program exits
+    memory : records the peak memory of every stage with tracemalloc
+    profile : runs cProfile until export_trace/disable is called
+    '''
+    global _recorder
+    disable()
+    _recorder = _Recorder(trace_path, memory, profile)
+    if not trace_path is None:
+        atexit.register(_export_at_exit, _recorder)
+
+
+def disable():
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if not recorder is None and not recorder.profiler is None:
+        recorder.profiler.disable()
+    return recorder
+
+
+def is_enabled():
+    return not _recorder is None
+
+
+def _export_at_exit(recorder):
+    if recorder is _recorder: # not replaced by a later enable()
+        export_trace(recorder.trace_path)
+
+
+
+@contextmanager
+def stage(name, **attributes):
+    '''
+    Records the wall time (and peak memory) of the code inside the with-block, stages can be nested.
+
+    Parameters
+    ----------
+    name : name of the stage, for example "coefficients"
+    attributes : additional information saved in the trace (for example N=160)
+    '''
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+
+    stack = recorder.get_stack()
+    entry = {"name": name, "start": time.perf_counter(), "peak": 0}
+    if recorder.memory:
+        current, peak = tracemalloc.get_traced_memory()
+        entry["memory_start"] = current
+        if len(stack) > 0: # the peak of the outer stage so far would be lost by the reset
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+    stack += [entry]
+    try:
+        yield
+    finally:
+        end_time = time.perf_counter()
+        stack.pop()
+        event = {"name": name, "start": entry["start"] - recorder.start_time, "duration": end_time - entry["start"],
+                 "thread": threading.get_ident(), "depth": len(stack), "attributes": attributes}
+        if recorder.memory:
+            # the peak of tracemalloc is reset by every stage, so the peak of the inner stages is handed to the outer ones
+            peak = max(entry["peak"], tracemalloc.get_traced_memory()[1])
+            event["peak_memory"] = peak - entry["memory_start"]
+            tracemalloc.reset_peak()
+            if len(stack) > 0:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        with recorder.lock:
+            recorder.events += [event]
+
+
+def timed(name=None):
+    '''
+    Decorator, every call of the function is recorded as stage (default name: name of the function)
+    '''
+    def decorator(func):
+        stage_name = name or func.__qualname__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    '''
+    Adds n to the counter name (for example the number of integrand evaluations).
+    '''
+    recorder = _recorder
+    if recorder is None:
+        return
+    with recorder.lock:
+        recorder.counters[name] = recorder.counters.get(name, 0) + n
+
+
+
+def get_summary():
+    '''
+    Returns
+    -------
+    Dict with total time, number of calls (and maximal peak memory) of every stage and all counters
+    '''
+    recorder = _recorder
+    if recorder is None:
+        return {}
+    with recorder.lock:
+        events, counters = list(recorder.events), dict(recorder.counters)
+
+    stages = {}
+    for event in events:
+        summary = stages.setdefault(event["name"], {"calls": 0, "total_time": 0.0})
+        summary["calls"] += 1
+        summary["total_time"] += event["duration"]
+        if "peak_memory" in event:
+            summary["peak_memory"] = max(summary.get("peak_memory", 0), event["peak_memory"])
+    return {"wall_time": time.perf_counter() - recorder.start_time, "stages": stages, "counters": counters}
+
+
+def export_trace(path):
+    '''
+    Writes the recorded stages into a json file. "traceEvents" uses the chrome trace format
+    (can be opened with chrome://tracing or https://ui.perfetto.dev), "summary" is the result of get_summary.
+    With profiling the cProfile statistics are saved as path + ".prof" (for example for pstats or snakeviz).
+    '''
+    recorder = _recorder
+    if recorder is None:
+        return
+    with recorder.lock:
+        events = list(recorder.events)
+
+    trace_events = [{"name": event["name"], "ph": "X", "ts": event["start"] * 1e6, "dur": event["duration"] * 1e6,
+                     "pid": os.getpid(), "tid": event["thread"],
+                     "args": dict(event["attributes"], **({"peak_memory": event["peak_memory"]} if "peak_memory" in event else {}))}
+                    for event in events]
+    trace = {"traceEvents": trace_events, "summary": get_summary()}
+    with open(path, "w") as trace_file:
+        json.dump(trace, trace_file, indent=1, default=str)
+
+    if not recorder.profiler is None:
+        recorder.profiler.disable()
+        recorder.profiler.dump_stats(path + ".prof")
+        recorder.profiler.enable()
+
+
+
+if os.environ.get(ENV_TRACE):
+    enable(os.environ[ENV_TRACE], memory=os.environ.get(ENV_MEMORY) == "1", profile=os.environ.get(ENV_PROFILE) == "1")
@@ -17,8 +17,10 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
 import time
+from functools import lru_cache
 import numpy as np
-import scipy.optimize
+
+import instrumentation
 
 
 class IS():
@@ -28,6 +30,20 @@ class IS():
     Z_GAUSS_QUAD = "zGQ" # Zusammengesetzte Gauß Quadratur (Ordnung wird beim Aufrufen bestimmt)
     Z_TRAPEZOIDAL = "zTR" # Zusammengesetzte Trapezregel
     Z_MIDPOINT = "zMID" # Zusammengesetzte Mittelpunktsregel
+    Z_ADAPTIVE_GK = "aGK" # Adaptive Gauß-Kronrod Quadratur (7/15 Punkte) mit Intervallhalbierung
+    ADAPTIVE_TOLERANCE = 1e-8 # default absolute tolerance of Z_ADAPTIVE_GK (also used by get_fourier_coeff)
+    
+    # Kronrod nodes on [-1, 1] (only the non-negative half) with weights, every odd node is also a 7-point Gauß node
+    _KRONROD_NODES = np.array([0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+                               0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+                               0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+                               0.207784955007898467600689403773245, 0.000000000000000000000000000000000])
+    _KRONROD_WEIGHTS = np.array([0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+                                 0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+                                 0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+                                 0.204432940075298892414161999234649, 0.209482141084727828012999174891714])
+    _GAUSS_7_WEIGHTS = np.array([0, 0.129484966168869693270611432679082, 0, 0.279705391489276667901467771423780,
+                                 0, 0.381830050505118944950369775488975, 0, 0.417959183673469387755102040816327])
     
     @staticmethod
     def get_all_method_strings():
@@ -37,7 +53,7 @@ class IS():
         Numpy-String-Array
             Array with every possible method-string
         '''
-        return np.array([IS.Z_SIMPSON_QUAD, IS.Z_GAUSS_QUAD, IS.Z_TRAPEZOIDAL, IS.Z_MIDPOINT])
+        return np.array([IS.Z_SIMPSON_QUAD, IS.Z_GAUSS_QUAD, IS.Z_TRAPEZOIDAL, IS.Z_MIDPOINT, IS.Z_ADAPTIVE_GK])
     
     def _get_integration_method(self):
         if self.method==self.Z_SIMPSON_QUAD:
@@ -61,15 +77,54 @@ class IS():
         '''
         assert isinstance(method_string, str), 'method_string of wrong type, must be a Member-String!'
         self.method, self.rhs, self.T_integrate = method_string, f, integration_time
+        self.error_estimate = None # set by the adaptive method
         
     
-    def get_approximation(self, n_steps, integration_time=None, n_gauss_param=4, show_needed_time=False, return_needed_time=False): # if integration time is set, Standard-Gauss-order 4
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def get_gauss_legendre(n):
+        '''
+        Returns
+        -------
+        nodes, weights : Gauß-Legendre quadrature of order n on [-1, 1] (calculated once per n, read-only arrays)
+        '''
+        nodes, weights = np.polynomial.legendre.leggauss(n)
+        nodes.flags.writeable, weights.flags.writeable = False, False
+        return nodes, weights
+    
+    
+    def _evaluate_rhs(self, x): # every evaluation of the integrand goes through here (counted by the instrumentation)
+        instrumentation.count("IS.integrand_calls")
+        instrumentation.count("IS.integrand_points", np.size(x))
+        return self.rhs(x)
+    
+    
+    def get_nodes_weights(self, n_steps, n_gauss_param=4):
+        '''
+        Returns
+        -------
+        nodes, weights : numpy-arrays, the integral of f is approximated by sum(weights * f(nodes))
+        '''
+        assert not(self.method == self.Z_ADAPTIVE_GK), "The adaptive method has no fixed nodes!"
+        method, needs_gauss_param = self._get_integration_method()
+        assert not(method == None), "Integration-method-string does not exist!"
+        
+        if needs_gauss_param: return method(n_steps, n_gauss_param) # Gauß-Quadratur
+        else: return method(n_steps) # Sonstige Quadratur
+    
+    
+    def get_approximation(self, n_steps, integration_time=None, n_gauss_param=4, show_needed_time=False, return_needed_time=False,
+                          tolerance=ADAPTIVE_TOLERANCE, breakpoints=None, max_level=30, return_error_estimate=False): # if integration time is set, Standard-Gauss-order 4
         '''
         Parameters
         ----------
         n_steps : int that represents the number of subinterval (for integration)
         integration_time : optional, if a specific (other than the initialized one) integration-time is needed
         n_gauss_param : optional, if specified order of gauss-quadrature. The default is 4.
+        tolerance : only adaptive method, absolute tolerance for the whole integral
+        breakpoints : only adaptive method, additional boundaries of the initial subintervals (for example the segment boundaries of an svg)
+        max_level : only adaptive method, maximal number of bisections of a subinterval
+        return_error_estimate : returns the error estimate of the adaptive method as last value
 
         Returns
         -------
@@ -77,82 +132,198 @@ class IS():
         '''
         if not (integration_time == None): self.T_integrate = np.array(integration_time) # for custom integration boundaries
         
-        integral = None
-        method, needs_gauss_param = self._get_integration_method()
-        assert not(method == None), "Integration-method-string does not exist!"
-        
         start_time = time.perf_counter()
-        if needs_gauss_param: integral = method(n_steps, n_gauss_param) # Gauß-Quadratur
-        else: integral = method(n_steps) # Sonstige Quadratur
+        if self.method == self.Z_ADAPTIVE_GK:
+            integral, self.error_estimate = self._gauss_kronrod_adaptive(n_steps, lambda x: np.asarray(self._evaluate_rhs(x))[:,np.newaxis],
+                                                                         tolerance, breakpoints, max_level)
+            integral = integral[0]
+        else:
+            nodes, weights = self.get_nodes_weights(n_steps, n_gauss_param)
+            integral = np.dot(weights, self._evaluate_rhs(nodes))
         end_time = time.perf_counter()
         
         if show_needed_time: print(self.method + " integration calculated in " + str( end_time - start_time ) + "s")
         
-        if return_needed_time: return integral, end_time-start_time
-        else: return integral
+        return self._get_return_values(integral, end_time-start_time, return_needed_time, return_error_estimate)
+        
+        
+        
+        
+        
+        
+    def get_batch_approximation(self, n_steps, frequencies=None, integration_time=None, n_gauss_param=4, chunk_size=256, show_needed_time=False, return_needed_time=False,
+                                tolerance=ADAPTIVE_TOLERANCE, breakpoints=None, max_level=30, return_error_estimate=False):
+        '''
+        Evaluates the integrand only once on the whole grid (subintervals x nodes) and returns a vector of integrals.
+        
+        Parameters
+        ----------
+        n_steps : int that represents the number of subinterval (for integration)
+        frequencies : optional, array of frequencies w. If given, the integrals of f(t)*exp(2*pi*i*w*t) are calculated for every w
+                      with one matrix multiply against the exp kernel. Otherwise f has to return an array of shape (len(t), ...)
+                      (matrix-valued integrand) and every component is integrated.
+        integration_time : optional, if a specific (other than the initialized one) integration-time is needed
+        n_gauss_param : optional, if specified order of gauss-quadrature. The default is 4.
+        chunk_size : number of frequencies per kernel matrix (bounds the memory to chunk_size x number of nodes),
+                     the adaptive method refines every chunk on its own. The integral of a frequency only depends on
+                     the chunk it is in, so splitting the frequencies at multiples of chunk_size gives identical results.
+        tolerance, breakpoints, max_level, return_error_estimate : only adaptive method, see get_approximation.
+                                                                   A subinterval is refined until every integral (of the chunk) is accurate enough.
+
+        Returns
+        -------
+        integrals : numpy-array with one integral per frequency (or per component of f)
+        '''
+        if not (integration_time == None): self.T_integrate = np.array(integration_time) # for custom integration boundaries
+        
+        start_time = time.perf_counter()
+        if self.method == self.Z_ADAPTIVE_GK:
+            value_shape = [] # shape of the (matrix-valued) integrand, known after the first evaluation
+            if frequencies is None:
+                def evaluate(x):
+                    values = np.asarray(self._evaluate_rhs(x))
+                    value_shape[:] = values.shape[1:]
+                    return values.reshape(x.shape[0], -1)
+                integrals, self.error_estimate = self._gauss_kronrod_adaptive(n_steps, evaluate, tolerance, breakpoints, max_level)
+                integrals = integrals.reshape(value_shape)
+            else:
+                frequencies = np.atleast_1d(frequencies)
+                integrals, self.error_estimate = np.empty(frequencies.shape[0], dtype=complex), 0
+                for i in range(0, frequencies.shape[0], chunk_size):
+                    evaluate = lambda x, chunk=frequencies[i:i+chunk_size]: np.exp(2j*np.pi * np.outer(x, chunk)) * np.asarray(self._evaluate_rhs(x))[:,np.newaxis]
+                    integrals[i:i+chunk_size], error_estimate = self._gauss_kronrod_adaptive(n_steps, evaluate, tolerance, breakpoints, max_level)
+                    self.error_estimate = max(self.error_estimate, error_estimate)
+            
+            end_time = time.perf_counter()
+            if show_needed_time: print(self.method + " batch integration calculated in " + str( end_time - start_time ) + "s")
+            return self._get_return_values(integrals, end_time-start_time, return_needed_time, return_error_estimate)
         
+        nodes, weights = self.get_nodes_weights(n_steps, n_gauss_param)
+        values = np.asarray(self._evaluate_rhs(nodes))
         
+        if frequencies is None:
+            integrals = np.tensordot(weights, values, axes=(0, 0))
+        else:
+            frequencies = np.atleast_1d(frequencies)
+            weighted_values = weights * values
+            integrals = np.empty(frequencies.shape[0], dtype=complex)
+            for i in range(0, frequencies.shape[0], chunk_size):
+                kernel = np.exp(2j*np.pi * np.outer(frequencies[i:i+chunk_size], nodes))
+                integrals[i:i+chunk_size] = kernel @ weighted_values
+        end_time = time.perf_counter()
+        
+        if show_needed_time: print(self.method + " batch integration calculated in " + str( end_time - start_time ) + "s")
+        
+        return self._get_return_values(integrals, end_time-start_time, return_needed_time, return_error_estimate)
+    
+    
+    def _get_return_values(self, integral, needed_time, return_needed_time, return_error_estimate):
+        ret_values = (integral,)
+        if return_needed_time: ret_values += (needed_time,)
+        if return_error_estimate: ret_values += (self.error_estimate,)
+        
+        if len(ret_values) == 1: return integral
+        else: return ret_values
         
         
         
         
     # Simpson-rule integration
     def _simpson(self, N):
-        """Integrate f, over [left, right], using Simpson quadrature.
+        """Nodes and weights to integrate f, over [left, right], using Simpson quadrature.
         N     : number of subintervals
         """
-        integral = 0 #Rückgabewert des Integrals
         x_n, h = np.linspace(self.T_integrate[0], self.T_integrate[1], N + 1, retstep=True) #Die Intervallrandwerte und -breite    
-        integral = (h/6) * ( self.rhs(self.T_integrate[0]) + 2 * sum(self.rhs(x_n[1:-1])) + 4 * sum(self.rhs((x_n[:-1] + x_n[1:]) / 2)) + self.rhs(self.T_integrate[1]) )
-        return integral
+        weights_edge = np.full(N + 1, 2*h/6)
+        weights_edge[[0, -1]] = h/6
+        nodes = np.concatenate((x_n, (x_n[:-1] + x_n[1:]) / 2))
+        weights = np.concatenate((weights_edge, np.full(N, 4*h/6)))
+        return nodes, weights
     
     
     # Gauß-Legendre integration (chained)
-    def _gauss_legendre_step(self, left, right, x_n, w_n):
-        '''
-        Integrate self.rhs, over [left, right], using Gauss-Legendre quadrature.
-        n       : degree of the quadrature rule
-        x_n     : node-parameters
-        w_n     : weight-parameters
-        '''
-        f_ref = lambda x: ((right - left) / 2) * self.rhs( (left/2.0) * (1 - x) + (right/2.0) * (1 + x) ) # Fkt. auf neuem Referenzintervall, damit x_n und w_n passen
-        integral = 0
-        for n in range(len(x_n)):
-            integral += w_n[n] * f_ref(x_n[n])
-        return integral
-    
     def _gauss_legendre(self, N, n):
         '''
-        Integrate self.rhs, over self.T_integrate, using the chained Gauss-Legendre quadrature.
+        Nodes and weights to integrate self.rhs, over self.T_integrate, using the chained Gauss-Legendre quadrature.
         n       : degree of the quadrature rule per subinterval
         N       : number of subintervals
         '''
         x_n, h = np.linspace(self.T_integrate[0], self.T_integrate[1], N + 1, retstep=True) #Die Intervallrandwerte und -breite 
-        nodes, weights = scipy.special.roots_legendre(n) # Punkte x_n und Gewichte w_n der Gauß-Quadratur
-        integral = sum(self._gauss_legendre_step(x_n[:-1], x_n[1:], nodes, weights))
-        return integral
+        ref_nodes, ref_weights = self.get_gauss_legendre(n) # Punkte x_n und Gewichte w_n der Gauß-Quadratur
+        
+        # map the reference interval [-1, 1] onto every subinterval, shape (N, n)
+        nodes = (x_n[:-1,np.newaxis]/2.0) * (1 - ref_nodes) + (x_n[1:,np.newaxis]/2.0) * (1 + ref_nodes)
+        weights = np.broadcast_to(h/2 * ref_weights, nodes.shape)
+        return nodes.ravel(), weights.ravel()
     
     # chained trapezoidal rule
     def _trapezoidal(self, N):
         """
-        Trapezoidal quadrature of function f from left to right with N subintervals.
+        Nodes and weights of the trapezoidal quadrature of function f from left to right with N subintervals.
         N:            Number of subintervals
         """
         x_n, h = np.linspace(self.T_integrate[0], self.T_integrate[1], N + 1, retstep=True) #Die Werte x_k für später und Intervallbreite h
-        integral = h/2 * self.rhs(x_n[0]) + h * sum(self.rhs(x_n[1:-1])) + h/2 * self.rhs(x_n[-1]) #Integral Berechnung:
-        return integral
+        weights = np.full(N + 1, h)
+        weights[[0, -1]] = h/2
+        return x_n, weights
 
     # chained midpoint rule
     def _midpoint(self, N):
         """
-        Integrate self.rhs, over self.T_integrate, using the midpoint rule.
+        Nodes and weights to integrate self.rhs, over self.T_integrate, using the midpoint rule.
         N     : number of subintervals
         """
         x_n, h = np.linspace(self.T_integrate[0], self.T_integrate[1], N + 1, retstep=True) #Die Intervallgrenzwerte und Intervallbreiten
-        integral = h * sum(self.rhs((x_n[:-1] + x_n[1:]) / 2))
-        return integral
+        return (x_n[:-1] + x_n[1:]) / 2, np.full(N, h)
+    
+    # adaptive Gauß-Kronrod quadrature
+    def _gauss_kronrod_adaptive(self, N, evaluate, tolerance, breakpoints, max_level):
+        '''
+        Integrate over self.T_integrate with the 15-point Kronrod rule, the difference to the embedded 7-point Gauß rule
+        is the error estimate of every subinterval. Subintervals with a too large error are bisected (all of them are evaluated at once).
+        N           : number of initial subintervals
+        evaluate    : callable, gets an array of nodes and returns an array of shape (number of nodes, number of integrals)
+        tolerance   : absolute tolerance, every subinterval gets the share of its length
+        breakpoints : additional boundaries of the initial subintervals
+        max_level   : maximal number of bisections
+        
+        Returns
+        -------
+        integrals, error_estimate
+        '''
+        left, right = self.T_integrate[0], self.T_integrate[1]
+        boundaries = np.linspace(left, right, N + 1)
+        if not breakpoints is None:
+            breakpoints = np.asarray(breakpoints, dtype=float)
+            boundaries = np.unique(np.concatenate((boundaries, breakpoints[(left < breakpoints) & (breakpoints < right)])))
+        lower, upper = boundaries[:-1], boundaries[1:]
+        
+        ref_nodes = np.concatenate((-self._KRONROD_NODES[:-1], self._KRONROD_NODES[::-1]))
+        kronrod_weights = np.concatenate((self._KRONROD_WEIGHTS[:-1], self._KRONROD_WEIGHTS[::-1]))
+        gauss_weights = np.concatenate((self._GAUSS_7_WEIGHTS[:-1], self._GAUSS_7_WEIGHTS[::-1]))
+        
+        integrals, error_estimate = 0, 0
+        for level in range(max_level + 1):
+            center, half_width = (lower + upper) / 2, (upper - lower) / 2
+            nodes = center[:,np.newaxis] + half_width[:,np.newaxis] * ref_nodes # shape (subintervals, 15)
+            values = evaluate(nodes.ravel()).reshape(nodes.shape + (-1,))
+            
+            kronrod = half_width[:,np.newaxis] * np.einsum("ijm,j->im", values, kronrod_weights)
+            gauss = half_width[:,np.newaxis] * np.einsum("ijm,j->im", values, gauss_weights)
+            errors = np.amax(np.abs(kronrod - gauss), axis=1)
+            
+            accepted = errors <= tolerance * (upper - lower) / (right - left)
+            if level == max_level: accepted[:] = True # no more refinement, take what we have
+            integrals = integrals + np.sum(kronrod[accepted], axis=0)
+            error_estimate += np.sum(errors[accepted])
+            
+            lower, upper, center = lower[~accepted], upper[~accepted], center[~accepted]
+            if lower.shape[0] == 0:
+                break
+            lower, upper = np.concatenate((lower, center)), np.concatenate((center, upper)) # bisection
+        
+        return integrals, error_estimate
 
     
     
     
-    
\ No newline at end of file
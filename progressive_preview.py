@@ -0,0 +1,114 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+import queue
+import threading
+
+import numpy as np
+
+from integral_solver import IS
+from coefficient_store import CoefficientStore
+from fourier_series import fourier_eval, get_fourier_data
+
+
+def get_levels(N, n_eval, n_levels=3, N_min=8):
+    '''
+    Returns
+    -------
+    List of (N, n_eval) from a coarse preview up to the full resolution (N grows geometric, n_eval proportional)
+    '''
+    N_list = np.unique(np.geomspace(min(N_min, N), N, n_levels).round().astype(int))
+    return [(int(level_N), max(2, int(n_eval * (i + 1) / len(N_list)))) for i, level_N in enumerate(N_list)]
+
+
+
+class ProgressivePreview():
+
+    def __init__(self, func, T=[0, 1], levels=[(8, 750), (40, 1500), (160, 3000)], method_string=IS.Z_GAUSS_QUAD, n_steps=200, n_gauss_param=6):
+        '''
+        Calculates the data of fourier_animation for a coarse N first and refines it in a background thread
+        (more coefficients and a denser t_eval), the coefficients of a level are reused by the next one (see CoefficientStore).
+
+        Parameters
+        ----------
+        func : vectorized callable (for example lambda t: handler.get_point(t, reverse=...))
+        T : [left, right] boundaries (one period)
+        levels : list of (N, n_eval), see get_levels
+        method_string, n_steps, n_gauss_param : quadrature of the coefficients
+        '''
+        self.T, self.period, self.levels = T, T[1] - T[0], levels
+        self.store = CoefficientStore(func, T, method_string=method_string, n_steps=n_steps, n_gauss_param=n_gauss_param)
+
+        self.updates = queue.Queue()
+        self.coeff = None # (ind, coeff) of the finest level so far
+        self._closed = False
+        self._thread = None
+
+
+    def _calc_level(self, N, n_eval): # (figure_data, fourier_data) of fourier_animation
+        ind, coeff = self.store.get_fourier_coeff(N)
+        t_eval = np.linspace(self.T[0], self.T[1], n_eval)
+        fourier_evaluated = fourier_eval(ind, coeff, t_eval, period=self.period)
+        figure_data = np.empty((t_eval.shape[0], 2))
+        figure_data[:,0] = np.real(fourier_evaluated)
+        figure_data[:,1] = -np.imag(fourier_evaluated)
+        self.coeff = (ind, coeff)
+        return figure_data, get_fourier_data(t_eval, coeff, ind, period=self.period)
+
+
+    def get_first(self):
+        '''
+        Returns
+        -------
+        figure_data, fourier_data of the coarsest level (calculated in the calling thread)
+        '''
+        return self._calc_level(*self.levels[0])
+
+
+    def start(self): # calculates the other levels in the background
+        self._thread = threading.Thread(target=self._refine, daemon=True)
+        self._thread.start()
+
+
+    def _refine(self):
+        for N, n_eval in self.levels[1:]:
+            if self._closed:
+                return
+            self.updates.put(self._calc_level(N, n_eval))
+
+
+    def get_update(self):
+        '''
+        Returns
+        -------
+        None or the newest (figure_data, fourier_data) since the last call (does not block, can be used as data_updates of fourier_animation)
+        '''
+        update = None
+        while True:
+            try:
+                update = self.updates.get_nowait()
+            except queue.Empty:
+                return update
+
+
+    def is_done(self):
+        return not self._thread is None and not self._thread.is_alive() and self.updates.empty()
+
+
+    def close(self): # stops after the level that is calculated at the moment
+        self._closed = True
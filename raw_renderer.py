@@ -0,0 +1,187 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+import os
+import tempfile
+import subprocess
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import instrumentation
+
+
+BACKGROUND_COLOR = (255, 255, 255)
+GRAPH_COLOR = (31, 119, 180) # same colors as matplotlib (tab:blue and tab:orange)
+VECTOR_COLOR = (255, 127, 14)
+
+
+def _get_stamp(radius): # pixel offsets of a filled circle (used as "pen")
+    offsets = np.arange(-int(radius), int(radius) + 1)
+    rows, cols = np.meshgrid(offsets, offsets, indexing="ij")
+    inside = rows**2 + cols**2 <= radius**2
+    return rows[inside], cols[inside]
+
+
+def _draw_points(buffer, rows, cols, color, radius):
+    stamp_rows, stamp_cols = _get_stamp(radius)
+    rows = (np.round(rows)[:,np.newaxis] + stamp_rows).ravel().astype(int)
+    cols = (np.round(cols)[:,np.newaxis] + stamp_cols).ravel().astype(int)
+    inside = (0 <= rows) & (rows < buffer.shape[0]) & (0 <= cols) & (cols < buffer.shape[1])
+    buffer[rows[inside], cols[inside]] = color
+
+
+def _draw_polyline(buffer, points, color, radius): # points in pixel coordinates, shape (n, 2) with (row, col)
+    if points.shape[0] == 1:
+        _draw_points(buffer, points[:,0], points[:,1], color, radius)
+        return
+    start, direction = points[:-1], points[1:] - points[:-1]
+    n_samples = np.ceil(np.amax(np.abs(direction), axis=1)).astype(int) + 1 # about one sample per pixel
+
+    segment = np.repeat(np.arange(start.shape[0]), n_samples)
+    first_sample = np.cumsum(n_samples) - n_samples
+    s = (np.arange(segment.shape[0]) - first_sample[segment]) / np.maximum(n_samples[segment] - 1, 1)
+    samples = start[segment] + s[:,np.newaxis] * direction[segment]
+    _draw_points(buffer, samples[:,0], samples[:,1], color, radius)
+
+
+
+class RawFrameRenderer():
+
+    def __init__(self, figure_data, fourier_data, width=1920, height=None, add_margin=0.1, line_width=3, bounds=None):
+        '''
+        Rasterizes the animation of fourier_animation (trace and fourier vector) directly into numpy rgb buffers.
+
+        Parameters
+        ----------
+        figure_data, fourier_data : same as in fourier_animation (fourier_data can be None)
+        width : width of the frames in pixels
+        height : None keeps the aspect ratio of the data
+        bounds : optional ((x_min, x_max), (y_min, y_max)), otherwise calculated from the data
+        '''
+        self.figure_data, self.fourier_data = figure_data, fourier_data
+        if bounds is None:
+            data = figure_data if fourier_data is None else fourier_data
+            bounds = ((np.amin(data[...,0]), np.amax(data[...,0])), (np.amin(data[...,1]), np.amax(data[...,1])))
+        (x_min, x_max), (y_min, y_max) = bounds
+        x_abs, y_abs = x_max - x_min, y_max - y_min
+
+        if height is None:
+            height = int(width * y_abs / x_abs)
+        self.width, self.height = width - width % 2, height - height % 2 # ffmpeg (yuv420p) needs even sizes
+        self.line_width = line_width
+
+        self.scale = min(self.width / (x_abs * (1 + 2*add_margin)), self.height / (y_abs * (1 + 2*add_margin)))
+        self.center = ((x_min + x_max) / 2, (y_min + y_max) / 2)
+
+        self.trace = np.empty((self.height, self.width, 3), dtype=np.uint8) # background with the trace drawn so far
+        self.trace[:] = BACKGROUND_COLOR
+        self.trace_end = -1 # index of the last point of figure_data inside self.trace
+
+
+    def _to_pixels(self, xy): # (x, y) -> (row, col)
+        rows = self.height / 2 - (xy[...,1] - self.center[1]) * self.scale
+        cols = self.width / 2 + (xy[...,0] - self.center[0]) * self.scale
+        return np.stack((rows, cols), axis=-1)
+
+
+    def get_frame(self, num):
+        '''
+        Returns
+        -------
+        RGB frame (height, width, 3) that shows the trace up to figure_data[num] and the fourier vector of fourier_data[num].
+        Frames have to be requested in increasing order, only the new part of the trace is drawn.
+        '''
+        if num > self.trace_end:
+            first = max(self.trace_end, 0) # connect to the last drawn point
+            _draw_polyline(self.trace, self._to_pixels(self.figure_data[first:num+1]), GRAPH_COLOR, self.line_width / 2)
+            self.trace_end = num
+
+        frame = self.trace.copy()
+        if not self.fourier_data is None:
+            vector_points = self._to_pixels(np.asarray(self.fourier_data[num]))
+            _draw_polyline(frame, vector_points, VECTOR_COLOR, self.line_width / 4)
+            _draw_points(frame, vector_points[:,0], vector_points[:,1], VECTOR_COLOR, self.line_width * 0.6)
+        return frame
+
+
+
+def _get_frame_numbers(n_points, animation_time, fps): # same frames as fourier_animation
+    plot_speed = max(1, int(n_points / animation_time / fps))
+    return np.arange(n_points // plot_speed) * plot_speed
+
+
+def _get_ffmpeg_command(ffmpeg, width, height, fps, output, crf):
+    return [ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "-", "-an", "-c:v", "libx264", "-pix_fmt", "yuv420p", "-crf", str(crf), output]
+
+
+def _render_part(figure_data, fourier_data, frame_numbers, output, fps, width, height, line_width, bounds, ffmpeg, crf): # work of one process
+    renderer = RawFrameRenderer(figure_data, fourier_data, width=width, height=height, line_width=line_width, bounds=bounds)
+    process = subprocess.Popen(_get_ffmpeg_command(ffmpeg, renderer.width, renderer.height, fps, output, crf), stdin=subprocess.PIPE)
+    try:
+        for num in frame_numbers:
+            process.stdin.write(renderer.get_frame(num).tobytes())
+            instrumentation.count("encoded_frames")
+    finally:
+        process.stdin.close()
+        return_code = process.wait()
+    assert return_code == 0, f"ffmpeg failed with exit code {return_code}"
+    return output
+
+
+@instrumentation.timed()
+def save_raw_video(figure_data, fourier_data, output, animation_time=20, fps=25, width=1920, height=None, line_width=3,
+                   n_workers=1, ffmpeg="ffmpeg", crf=18, bounds=None):
+    '''
+    Saves the same animation as fourier_animation (without axes and labels), but every frame is rasterized with numpy
+    and piped as raw rgb frames into an ffmpeg subprocess (no matplotlib involved).
+
+    Parameters
+    ----------
+    figure_data, fourier_data, animation_time : same as in fourier_animation
+    output : path of the video
+    fps, width, height, line_width : format of the video (height=None keeps the aspect ratio)
+    n_workers : number of processes (None uses every core), every process renders a range of frames into its own file,
+                the parts are joined at the end
+    ffmpeg : path of the ffmpeg executable
+    crf : quality of libx264 (lower is better)
+    bounds : optional ((x_min, x_max), (y_min, y_max)) of the data (for example FrameStore.bounds)
+    '''
+    if bounds is None: # same for every part
+        data = figure_data if fourier_data is None else fourier_data
+        bounds = ((np.amin(data[...,0]), np.amax(data[...,0])), (np.amin(data[...,1]), np.amax(data[...,1])))
+    frame_numbers = _get_frame_numbers(figure_data.shape[0], animation_time, fps)
+    n_workers = min(n_workers or os.cpu_count() or 1, frame_numbers.shape[0])
+
+    if n_workers == 1:
+        _render_part(figure_data, fourier_data, frame_numbers, output, fps, width, height, line_width, bounds, ffmpeg, crf)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        parts = np.array_split(frame_numbers, n_workers)
+        part_files = [os.path.join(tmp_dir, f"part{i}.mp4") for i in range(len(parts))]
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            list(pool.map(_render_part, repeat(figure_data), repeat(fourier_data), parts, part_files, repeat(fps), repeat(width),
+                          repeat(height), repeat(line_width), repeat(bounds), repeat(ffmpeg), repeat(crf)))
+
+        list_file = os.path.join(tmp_dir, "parts.txt")
+        with open(list_file, "w") as parts_list:
+            parts_list.writelines([f"file '{part_file}'\n" for part_file in part_files])
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", output], check=True)
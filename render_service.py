@@ -0,0 +1,412 @@
+'''
+Copyright (C) 2022  https://github.com/aliemen/
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+'''
+
+
+import os
+import json
+import queue
+import hashlib
+import argparse
+import tempfile
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from svg_handler import SVG_Handler
+from coefficient_cache import CoefficientCache, get_coeff_params, evict_lru
+from fourier_series import get_fourier_coeff_fft, fourier_eval, get_fourier_data, get_fourier_latex, get_desmos_string
+
+
+# parameters of a request (query string or json body) and their defaults
+DEFAULT_PARAMS = {
+    "N": 160,
+    "reverse": True,
+    "parametrization": SVG_Handler.PARAM_UNIFORM,
+    "animation_time": 30,
+    "n_eval": 3000,
+    "fps": 25,
+    "width": 1920,
+    "raw": True, # True renders with raw_renderer (no matplotlib), False with matplotlib (one video at a time)
+}
+# allowed ranges [min, max] of the numeric parameters, so that a single request can not tie up the service
+PARAM_LIMITS = {
+    "N": (0, 2000),
+    "animation_time": (1, 600),
+    "n_eval": (2, 100000),
+    "fps": (1, 60),
+    "width": (2, 3840),
+}
+T = [0, 1]
+
+
+class _LRU():
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def get(self, key, create):
+        '''
+        Returns the entry of key, calls create() if it is not known (outside of the lock, so that other keys are not blocked)
+        '''
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        value = create()
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return value
+
+
+
+class ServiceBusy(Exception): # the job queue is full
+    pass
+
+
+
+class BadRequest(Exception): # invalid parameters of a request (answered with 400)
+    pass
+
+
+
+class RenderService():
+
+    def __init__(self, work_dir=".render_service", n_workers=2, queue_size=16, max_handlers=32, max_coefficients=256, max_svg_mb=256,
+                 use_disk_cache=True):
+        '''
+        Keeps svg handlers and coefficients in memory (LRU) and runs the jobs of all clients in a pool of worker threads.
+
+        Parameters
+        ----------
+        work_dir : directory of the uploaded svg files (stored by content hash)
+        n_workers : number of worker threads
+        queue_size : number of jobs that can wait, further jobs are rejected (ServiceBusy)
+        max_handlers, max_coefficients : size of the LRUs
+        max_svg_mb : if the stored svg files get larger, the least recently used ones are deleted
+        use_disk_cache : also uses the CoefficientCache on disk (shared with FourierMain and batch_render)
+        '''
+        self.svg_dir, self.max_svg_size = os.path.join(work_dir, "svg"), max_svg_mb * 2**20
+        self.svg_in_use, self.svg_lock = {}, threading.Lock() # file name -> number of running requests (not evicted)
+        os.makedirs(self.svg_dir, exist_ok=True)
+        self.handlers, self.coefficients = _LRU(max_handlers), _LRU(max_coefficients)
+        self.disk_cache = CoefficientCache() if use_disk_cache else None
+        self.matplotlib_lock = threading.Lock() # pyplot is not thread safe
+
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(n_workers)]
+        for worker in self.workers:
+            worker.start()
+
+
+    def _work(self):
+        while True:
+            future, func, args = self.jobs.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args))
+                except Exception as error:
+                    future.set_exception(error)
+
+
+    def submit(self, func, *args):
+        '''
+        Returns
+        -------
+        Future of func(*args), calculated by a worker thread. Raises ServiceBusy if the queue is full.
+        '''
+        future = Future()
+        try:
+            self.jobs.put_nowait((future, func, args))
+        except queue.Full:
+            raise ServiceBusy("Too many jobs, try again later.")
+        return future
+
+
+    def get_status(self):
+        return {"queued": self.jobs.qsize(), "queue_size": self.jobs.maxsize, "workers": len(self.workers),
+                "handlers": len(self.handlers), "coefficients": len(self.coefficients)}
+
+
+    def store_svg(self, svg_bytes):
+        '''
+        Returns
+        -------
+        Path of the svg file (same content --> same file). The file is in use (not evicted) until release_svg is called.
+        '''
+        if len(svg_bytes) > self.max_svg_size:
+            raise BadRequest(f"The svg file has to be at most {self.max_svg_size} bytes")
+        name = hashlib.sha256(svg_bytes).hexdigest() + ".svg"
+        svg_path = os.path.join(self.svg_dir, name)
+        with self.svg_lock:
+            self.svg_in_use[name] = self.svg_in_use.get(name, 0) + 1
+
+        if os.path.isfile(svg_path):
+            try:
+                os.utime(svg_path) # marks the file as recently used
+                return svg_path
+            except FileNotFoundError: # evicted in the meantime
+                pass
+        tmp_path = svg_path + f".{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as svg_file:
+            svg_file.write(svg_bytes)
+        os.replace(tmp_path, svg_path)
+        with self.svg_lock:
+            in_use = set(self.svg_in_use)
+        evict_lru(self.svg_dir, self.max_svg_size, ".svg", keep=in_use) # LRU on disk, same as the CoefficientCache
+        return svg_path
+
+
+    def release_svg(self, svg_path): # see store_svg
+        name = os.path.basename(svg_path)
+        with self.svg_lock:
+            self.svg_in_use[name] -= 1
+            if self.svg_in_use[name] == 0:
+                del self.svg_in_use[name]
+
+
+    def get_handler(self, svg_path, parametrization):
+        return self.handlers.get((svg_path, parametrization), lambda: SVG_Handler(svg_path, parametrization=parametrization))
+
+
+    def get_coefficients(self, svg_path, params):
+        '''
+        Returns
+        -------
+        indizes, coeff (from the LRU, the disk cache or calculated with get_fourier_coeff_fft)
+        '''
+        def calc_coeff():
+            handler = self.get_handler(svg_path, params["parametrization"])
+            return get_fourier_coeff_fft(lambda t: handler.get_point(t, reverse=params["reverse"]), T=T, N=params["N"])
+
+        coeff_params = get_coeff_params(N=params["N"], T=T, reverse=params["reverse"], parametrization=params["parametrization"])
+        def load_coeff():
+            if self.disk_cache is None:
+                return calc_coeff()
+            return self.disk_cache.get_fourier_coeff(svg_path, calc_coeff, **coeff_params)
+
+        return self.coefficients.get((svg_path, json.dumps(coeff_params, sort_keys=True)), load_coeff)
+
+
+    def render_video(self, svg_path, params):
+        '''
+        Returns
+        -------
+        Bytes of the mp4 video
+        '''
+        ind, coeff = self.get_coefficients(svg_path, params)
+        t_eval = np.linspace(T[0], T[1], params["n_eval"])
+        fourier_evaluated = fourier_eval(ind, coeff, t_eval, period=T[1]-T[0])
+        figure_data = np.stack((np.real(fourier_evaluated), -np.imag(fourier_evaluated)), axis=-1)
+        fourier_data = get_fourier_data(t_eval, coeff, ind, period=T[1]-T[0])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, "video.mp4")
+            if params["raw"]:
+                from raw_renderer import save_raw_video
+                save_raw_video(figure_data, fourier_data, output, animation_time=params["animation_time"], fps=params["fps"], width=params["width"])
+            else:
+                with self.matplotlib_lock:
+                    import matplotlib
+                    matplotlib.use("Agg")
+                    import matplotlib.pyplot as plt
+                    import matplotlib.animation as animation
+                    from animation import fourier_animation
+
+                    anim = fourier_animation(figure_data, fourier_data, animation_time=params["animation_time"], fast_render=True, show=False)
+                    anim.save(output, writer=animation.writers['ffmpeg'](fps=params["fps"], bitrate=30000))
+                    plt.close("all")
+            with open(output, "rb") as video_file:
+                return video_file.read()
+
+
+    def run_request(self, kind, svg_bytes, params):
+        '''
+        Parameters
+        ----------
+        kind : "coefficients", "desmos", "latex" or "video"
+
+        Returns
+        -------
+        content type, bytes of the answer
+        '''
+        svg_path = self.store_svg(svg_bytes)
+        try:
+            if kind == "video":
+                return "video/mp4", self.render_video(svg_path, params)
+
+            ind, coeff = self.get_coefficients(svg_path, params)
+            if kind == "coefficients":
+                answer = {"ind": ind.tolist(), "real": np.real(coeff).tolist(), "imag": np.imag(coeff).tolist()}
+                return "application/json", json.dumps(answer).encode()
+            if kind == "desmos":
+                return "text/plain; charset=utf-8", get_desmos_string(coeff, ind).encode()
+            return "text/plain; charset=utf-8", get_fourier_latex(coeff, ind).encode()
+        finally:
+            self.release_svg(svg_path)
+
+
+
+def _get_params(query, body_params): # request parameters with the types of DEFAULT_PARAMS
+    params = dict(DEFAULT_PARAMS)
+    for name, default in DEFAULT_PARAMS.items():
+        if name in body_params:
+            value = body_params[name]
+        elif name in query:
+            value = query[name][0]
+        else:
+            continue
+        if isinstance(default, bool):
+            params[name] = value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes")
+        elif isinstance(default, int):
+            if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()): # int() would truncate
+                raise BadRequest(f"{name} has to be an integer")
+            try:
+                params[name] = int(value)
+            except (TypeError, ValueError):
+                raise BadRequest(f"{name} has to be an integer")
+        else:
+            try:
+                params[name] = type(default)(value)
+            except (TypeError, ValueError):
+                raise BadRequest(f"{name} has to be of type {type(default).__name__}")
+    for name, (lower, upper) in PARAM_LIMITS.items():
+        if not lower <= params[name] <= upper:
+            raise BadRequest(f"{name} has to be between {lower} and {upper}")
+    if not params["parametrization"] in (SVG_Handler.PARAM_UNIFORM, SVG_Handler.PARAM_ARC_LENGTH):
+        raise BadRequest("Unknown parametrization")
+    return params
+
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+
+    service = None # set by serve
+    timeout_job = 3600 # seconds a request waits for its job
+    max_body_size = 16 * 2**20 # bytes, larger requests are rejected before the body is read
+
+    def _answer(self, status, content_type, content):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+    def _answer_error(self, status, message):
+        self._answer(status, "application/json", json.dumps({"error": message}).encode())
+
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/status":
+            self._answer(200, "application/json", json.dumps(self.service.get_status()).encode())
+        else:
+            self._answer_error(404, "Unknown path")
+
+
+    def do_POST(self):
+        '''
+        POST /coefficients, /desmos, /latex or /video
+        Body: the svg file (parameters in the query string, for example /desmos?N=50)
+              or json {"svg": "<svg ...>", "N": 50, ...}
+        '''
+        url = urlparse(self.path)
+        kind = url.path.strip("/")
+        if not kind in ("coefficients", "desmos", "latex", "video"):
+            self._answer_error(404, "Unknown path")
+            return
+
+        try:
+            body_size = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self._answer_error(400, "Bad request: invalid Content-Length")
+            return
+        if body_size < 0 or body_size > self.max_body_size:
+            self.close_connection = True # the body is not read
+            self._answer_error(413, f"The body has to be at most {self.max_body_size} bytes")
+            return
+
+        try:
+            body = self.rfile.read(body_size)
+            body_params = {}
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                body_params = json.loads(body)
+                if not isinstance(body_params, dict) or not isinstance(body_params.get("svg"), str):
+                    raise BadRequest('The json body has to be an object with the svg file as string ("svg")')
+                body = body_params.pop("svg").encode()
+            params = _get_params(parse_qs(url.query), body_params)
+            if len(body) > self.service.max_svg_size:
+                raise BadRequest(f"The svg file has to be at most {self.service.max_svg_size} bytes")
+        except BadRequest as error:
+            self._answer_error(400, f"Bad request: {error}")
+            return
+        except ValueError as error: # no valid json
+            self._answer_error(400, f"Bad request: {error!r}")
+            return
+
+        try:
+            content_type, content = self.service.submit(self.service.run_request, kind, body, params).result(timeout=self.timeout_job)
+        except ServiceBusy as error:
+            self._answer_error(503, str(error))
+        except BadRequest as error:
+            self._answer_error(400, f"Bad request: {error}")
+        except Exception:
+            self.log_error("%s", traceback.format_exc()) # the details stay in the log of the server
+            self._answer_error(500, "Internal server error")
+        else:
+            self._answer(200, content_type, content)
+
+
+
+def serve(host="127.0.0.1", port=8000, **service_args):
+    '''
+    Starts the http server (blocks), service_args are passed to RenderService.
+    '''
+    _RequestHandler.service = RenderService(**service_args)
+    server = ThreadingHTTPServer((host, port), _RequestHandler)
+    print(f"Render service running on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Local http service for fourier coefficients, desmos/latex strings and videos of svg files.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--work-dir", default=".render_service")
+    parser.add_argument("--no-disk-cache", action="store_true")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, work_dir=args.work_dir, n_workers=args.workers, queue_size=args.queue_size, use_disk_cache=not args.no_disk_cache)
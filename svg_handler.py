@@ -17,15 +17,118 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
 
+import time
+import struct
+import zipfile
 import numpy as np
-from svgpathtools import svg2paths
+
+import instrumentation
+
+
+def _horner(poly_table, func_index, use_t): # evaluates the polynomial poly_table[func_index[i]] at use_t[i] for every i
+    coeffs = poly_table[func_index]
+    values = coeffs[...,0] * np.ones_like(use_t)
+    for j in range(1, poly_table.shape[1]):
+        values = values * use_t + coeffs[...,j]
+    return values
+
+
+class CompiledCurve():
+    
+    
+    def __init__(self, poly_table, reverse=False, arc_table=None):
+        '''
+        The parametrized curve of an SVG_Handler, only numpy arrays (no svgpathtools objects or lambdas), so it can be pickled.
+        
+        Parameters
+        ----------
+        poly_table : row i holds the polynomial coefficients of function i (highest degree first)
+        reverse    : default direction if the object is called
+        arc_table  : optional (arc_lengths, arc_params) for the arc-length parametrization, arc_lengths[j] in [0, 1] is the
+                     normalized length of the curve up to the parameter arc_params[j] in [0, line_count] (function index + local t)
+        '''
+        self.poly_table, self.reverse, self.arc_table = poly_table, reverse, arc_table
+        self.line_count = poly_table.shape[0]
+        
+        
+    def __call__(self, t):
+        return self.get_point(t, reverse=self.reverse)
+    
+    
+    def get_point(self, t, reverse=False):
+        if isinstance(t, float):
+            t = [t]
+            
+        t = np.array(t, dtype=float)
+        
+        assert np.all(0 <= t) and np.all(t <= 1), "t has to be between 0 and 1"
+        if reverse:
+            t = -t + 1 # reverse for T \in [0, 1] 
+        
+        if self.arc_table is None: # same mapping as SVG_Handler._get_parameter_func, but for all t at once
+            scaled_t = t * self.line_count
+        else: # inverse lookup of the arc-length (binary search of every t, linear in between)
+            scaled_t = np.interp(t, *self.arc_table)
+        func_index = np.minimum(scaled_t.astype(int), self.line_count-1) # t=1 belongs to the last function
+        return _horner(self.poly_table, func_index, scaled_t - func_index)
+
+
+    def get_segment_boundaries(self, reverse=False): # parameters t where one function ends and the next one begins (kinks/jumps of the curve)
+        if self.arc_table is None:
+            boundaries = np.linspace(0, 1, self.line_count + 1)
+        else:
+            boundaries = np.interp(np.arange(self.line_count + 1), self.arc_table[1], self.arc_table[0])
+        if reverse:
+            boundaries = 1 - boundaries[::-1]
+        return boundaries
+
+
+def _load_npz_member(npz_path, name): # memory map of an array inside an uncompressed .npz file (np.load can only map .npy files)
+    with zipfile.ZipFile(npz_path) as archive:
+        info = archive.getinfo(name + ".npy")
+    assert info.compress_type == zipfile.ZIP_STORED, "only uncompressed files can be memory mapped"
+    
+    with open(npz_path, "rb") as npz_file:
+        npz_file.seek(info.header_offset)
+        local_header = npz_file.read(30) # the data starts after the local file header (30 bytes + name + extra field)
+        name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+        npz_file.seek(info.header_offset + 30 + name_length + extra_length)
+        
+        version = np.lib.format.read_magic(npz_file)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(npz_file)
+        offset = npz_file.tell()
+    
+    if shape == (): # memmap needs at least one element
+        return np.fromfile(npz_path, dtype=dtype, count=1, offset=offset).reshape(())
+    return np.memmap(npz_path, dtype=dtype, mode="r", shape=shape, offset=offset, order="F" if fortran_order else "C")
+
 
 
 class SVG_Handler():
     
+    # parametrizations of the whole curve
+    PARAM_UNIFORM = "uniform" # every function gets the same share of t (1/line_count)
+    PARAM_ARC_LENGTH = "arc_length" # t is proportional to the length of the curve
+    
+    
+    SORT_AUTO = "auto" # sorts the functions only for large images (at least SORT_MIN_FUNCTIONS functions, for example "free hand drawings")
+    SORT_MIN_FUNCTIONS = 1000
+    
     
-    def __init__(self, svg_path : str):
+    def __init__(self, svg_path : str, parametrization=PARAM_UNIFORM, arc_samples=32, sort_functions=SORT_AUTO, two_opt_time=0.0):
+        '''
+        Parameters
+        ----------
+        svg_path        : path of the svg file
+        parametrization : PARAM_UNIFORM or PARAM_ARC_LENGTH (integration samples are spent where the geometry is)
+        arc_samples     : points per function for the arc-length lookup table
+        sort_functions  : True, False or SORT_AUTO, orders (and reverses) the functions so that the jumps between them are small
+        two_opt_time    : time budget in seconds for improving the order with 2-opt (0 to skip)
+        '''
         self.path = svg_path
+        self.parametrization, self.arc_samples = parametrization, arc_samples
+        self.sort_functions, self.two_opt_time = sort_functions, two_opt_time
         
         # load svg file to process as parametrized function
         self._load_svg()
@@ -33,7 +136,79 @@ class SVG_Handler():
         
     
     
+    COMPILED_VERSION = 1 # version of the format of export_compiled
+    
+    
+    @classmethod
+    def from_compiled(cls, compiled_path, parametrization=PARAM_UNIFORM, arc_samples=32, mmap=False):
+        '''
+        Creates a handler from a file of export_compiled, without parsing the svg file (and without importing svgpathtools).
+        
+        Parameters
+        ----------
+        compiled_path   : path of the .npz file
+        parametrization, arc_samples : see __init__
+        mmap            : True maps the tables from the file instead of reading them (read-only)
+        '''
+        if mmap:
+            tables = {name: _load_npz_member(compiled_path, name) for name in ("version", "poly_table", "reference_table", "path_offsets")}
+        else:
+            with np.load(compiled_path) as compiled:
+                tables = {name: compiled[name] for name in compiled.files}
+        assert int(tables["version"]) == cls.COMPILED_VERSION, f"unknown version of the compiled file {compiled_path}"
+        
+        handler = cls.__new__(cls)
+        handler.path = compiled_path
+        handler.parametrization, handler.arc_samples = parametrization, arc_samples
+        handler.sort_functions, handler.two_opt_time = False, 0.0 # the order of the file is used
+        handler._all_functions, handler._all_paths = None, None # rebuilt from the tables if they are needed
+        
+        handler.reference_table, handler.path_offsets = tables["reference_table"], tables["path_offsets"]
+        handler.poly_table = tables["poly_table"]
+        handler.line_count = handler.poly_table.shape[0]
+        handler.arc_table = handler._get_arc_table() if parametrization == cls.PARAM_ARC_LENGTH else None
+        handler.curve = CompiledCurve(handler.poly_table, arc_table=handler.arc_table)
+        return handler
+    
+    
+    def export_compiled(self, compiled_path):
+        '''
+        Saves the compiled polynomial tables (in the order of the curve, after sorting) and the path boundaries
+        into an uncompressed .npz file, see from_compiled.
+        '''
+        np.savez(compiled_path, version=np.array(self.COMPILED_VERSION), poly_table=self.poly_table,
+                 reference_table=self.reference_table, path_offsets=self.path_offsets)
+    
+    
+    @property
+    def all_functions(self): # list of np.poly1d in the order of the curve
+        if self._all_functions is None:
+            self._all_functions = [np.poly1d(row) for row in self.poly_table]
+        return self._all_functions
+    
+    
+    @all_functions.setter
+    def all_functions(self, functions):
+        self._all_functions = functions
+    
+    
+    @property
+    def all_paths(self): # list of the paths of the svg file, every path is a list of np.poly1d
+        if self._all_paths is None:
+            self._all_paths = [[np.poly1d(row) for row in self.reference_table[self.path_offsets[i]:self.path_offsets[i+1]]]
+                               for i in range(self.path_offsets.shape[0] - 1)]
+        return self._all_paths
+    
+    
+    @all_paths.setter
+    def all_paths(self, paths):
+        self._all_paths = paths
+    
+    
+    @instrumentation.timed()
     def _load_svg(self):
+        from svgpathtools import svg2paths # only needed for svg files (not for compiled files)
+        
         tmp_paths, tmp_attributes = svg2paths(self.path)
         self.all_functions = [] # here we will safe all callable saved curves
         self.all_paths = []
@@ -50,55 +225,191 @@ class SVG_Handler():
             self.all_paths += [tmp_paths]
                
         self.line_count = len(self.all_functions) # total number of lines
-        #self._sort_functions() # kind of sorts the distinct paths --> does not really work if you used a "free hand drawing" in the svg
         
+        # all paths in one table (independent of the order of all_functions), path i has the rows path_offsets[i] to path_offsets[i+1]
+        self.reference_table = self._get_poly_table([func for path in self.all_paths for func in path])
+        self.path_offsets = np.cumsum([0] + [len(path) for path in self.all_paths])
+        if self.sort_functions == True or (self.sort_functions == self.SORT_AUTO and self.line_count >= self.SORT_MIN_FUNCTIONS):
+            self._sort_functions(two_opt_time=self.two_opt_time)
+        self._compile_functions()
         
-    def _get_next_func(self, prev_func, left_funcs): # returns index of next function
-        end_point = prev_func(1)
-        left_beginnings = np.array([func_t(0) for func_t in left_funcs], dtype=complex)
         
-        nearest_index = np.argmin(np.abs(np.conjugate(left_beginnings - end_point)))
-        return nearest_index
+    def _compile_functions(self): # dense table of all polynomial coefficients (has to be called again if all_functions changes)
+        self.poly_table = self._get_poly_table(self.all_functions)
+        self.arc_table = self._get_arc_table() if self.parametrization == self.PARAM_ARC_LENGTH else None
+        self.curve = CompiledCurve(self.poly_table, arc_table=self.arc_table)
+    
+    
+    def _get_arc_table(self): # cumulative (normalized) length at arc_samples points of every function, see CompiledCurve
+        local_t = np.linspace(0, 1, self.arc_samples + 1)
+        func_index = np.repeat(np.arange(self.line_count), self.arc_samples + 1)
+        points = _horner(self.poly_table, func_index, np.tile(local_t, self.line_count)).reshape(self.line_count, -1)
+        
+        arc_lengths = np.concatenate(([0], np.cumsum(np.abs(np.diff(points, axis=1)).ravel())))
+        arc_params = np.concatenate(([0], (np.arange(self.line_count)[:,np.newaxis] + local_t[1:]).ravel()))
+        return arc_lengths / arc_lengths[-1], arc_params
+    
+    
+    @staticmethod
+    def _get_poly_table(functions): # row i holds the coefficients of functions[i], highest degree first (padded with zeros)
+        degree = max([len(func.coeffs) for func in functions])
+        poly_table = np.zeros((len(functions), degree), dtype=complex)
+        for i, func in enumerate(functions):
+            poly_table[i, degree-len(func.coeffs):] = func.coeffs
+        return poly_table
+    
+    
+    @staticmethod
+    def _get_nearest_neighbour_order(starts, ends):
+        '''
+        Greedy nearest neighbour tour through all functions (starting with function 0), a function can be used reversed.
+        The endpoints are stored in a KD-tree, which is rebuilt without the used endpoints from time to time.
         
+        Returns
+        -------
+        order, reversed_flags : numpy-arrays, function order[i] (reversed if reversed_flags[i]) is the i-th function of the new curve
+        '''
+        from scipy.spatial import cKDTree # only needed for sorting
         
-    def _sort_functions(self): # should sort functions such that the curve is mostly "steady"
-        #print(self.all_functions)
-        tmp_funcs = self.all_functions
+        func_count = starts.shape[0]
+        endpoints = np.concatenate((starts, ends)) # endpoint i < func_count is a start, otherwise an end
+        used = np.zeros(func_count, dtype=bool)
+        order, reversed_flags = np.empty(func_count, dtype=int), np.zeros(func_count, dtype=bool)
         
-        new_functions = [tmp_funcs[0]]
-        tmp_funcs.pop(0)
+        order[0], used[0] = 0, True
+        current_point = ends[0]
+        tree_points = np.concatenate((np.arange(1, func_count), np.arange(1, func_count) + func_count)) # endpoints in the tree
+        if func_count > 1:
+            tree = cKDTree(np.stack((endpoints[tree_points].real, endpoints[tree_points].imag), axis=-1))
         
-        for i in range(1, self.line_count): # here add next function and remove if from list
-            next_ind = self._get_next_func(new_functions[-1], tmp_funcs)
-            new_functions += [tmp_funcs[next_ind]]
-            tmp_funcs.pop(next_ind)
+        for i in range(1, func_count):
+            if 2 * (func_count - i) < tree_points.shape[0] // 4: # most endpoints in the tree are used --> rebuild
+                tree_points = tree_points[~used[tree_points % func_count]]
+                tree = cKDTree(np.stack((endpoints[tree_points].real, endpoints[tree_points].imag), axis=-1))
             
-        self.all_functions = new_functions
+            k = 8
+            while True: # query more neighbours until an unused one is found
+                k = min(k, tree_points.shape[0])
+                _, neighbours = tree.query([current_point.real, current_point.imag], k=k)
+                neighbours = tree_points[np.atleast_1d(neighbours)]
+                free = neighbours[~used[neighbours % func_count]]
+                if free.shape[0] > 0 or k == tree_points.shape[0]:
+                    break
+                k *= 4
+            
+            nearest = free[0]
+            successor = order[i-1] + 1 if not reversed_flags[i-1] else order[i-1] - 1 # next function of the original order
+            if 0 <= successor < func_count and not used[successor]:
+                successor_point = ends[successor] if reversed_flags[i-1] else starts[successor]
+                if np.abs(successor_point - current_point) <= np.abs(endpoints[nearest] - current_point) + 1e-12:
+                    nearest = successor + func_count * reversed_flags[i-1] # keeps connected paths together
+            func_index, is_end = nearest % func_count, nearest >= func_count
+            order[i], reversed_flags[i], used[func_index] = func_index, is_end, True
+            current_point = starts[func_index] if is_end else ends[func_index]
+        
+        return order, reversed_flags
     
     
+    @staticmethod
+    def _two_opt(starts, ends, order, reversed_flags, time_budget):
+        '''
+        Improves the order by reversing blocks of functions (2-opt on the closed curve) until nothing improves
+        or time_budget (seconds) is used up.
+        '''
+        stop_time = time.perf_counter() + time_budget
+        func_count = order.shape[0]
+        tour_starts = np.where(reversed_flags, ends[order], starts[order])
+        tour_ends = np.where(reversed_flags, starts[order], ends[order])
+        
+        improved = True
+        while improved and time.perf_counter() < stop_time:
+            improved = False
+            for i in range(func_count - 2):
+                if time.perf_counter() >= stop_time:
+                    break
+                # reversing the block i+1, ..., j replaces the jumps E_i -> S_i+1 and E_j -> S_j+1 by E_i -> E_j and S_i+1 -> S_j+1
+                j = np.arange(i + 1, func_count)
+                next_j = (j + 1) % func_count
+                old_jumps = np.abs(tour_ends[i] - tour_starts[i+1]) + np.abs(tour_ends[j] - tour_starts[next_j])
+                new_jumps = np.abs(tour_ends[i] - tour_ends[j]) + np.abs(tour_starts[i+1] - tour_starts[next_j])
+                best = np.argmin(new_jumps - old_jumps)
+                if new_jumps[best] - old_jumps[best] < -1e-12:
+                    block = slice(i + 1, j[best] + 1)
+                    order[block], reversed_flags[block] = order[block][::-1], ~reversed_flags[block][::-1]
+                    tour_starts[block], tour_ends[block] = tour_ends[block][::-1].copy(), tour_starts[block][::-1].copy()
+                    improved = True
+        
+        return order, reversed_flags
+    
+    
+    @instrumentation.timed()
+    def _sort_functions(self, two_opt_time=0.0): # sorts (and reverses) the functions such that the curve is mostly "steady"
+        poly_table = self._get_poly_table(self.all_functions)
+        starts, ends = poly_table[:,-1], np.sum(poly_table, axis=1) # values at t=0 and t=1
+        
+        order, reversed_flags = self._get_nearest_neighbour_order(starts, ends)
+        if two_opt_time > 0:
+            order, reversed_flags = self._two_opt(starts, ends, order, reversed_flags, two_opt_time)
+        
+        def jump_length(order, reversed_flags): # sum of all jumps of the closed curve
+            tour_starts = np.where(reversed_flags, ends[order], starts[order])
+            tour_ends = np.where(reversed_flags, starts[order], ends[order])
+            return np.sum(np.abs(np.roll(tour_starts, -1) - tour_ends))
+        
+        original = np.arange(starts.shape[0])
+        if jump_length(original, np.zeros_like(reversed_flags)) <= jump_length(order, reversed_flags):
+            return # the original order is already better
+        
+        reverse_t = np.poly1d([-1, 1]) # t -> 1-t
+        self.all_functions = [self.all_functions[i](reverse_t) if is_reversed else self.all_functions[i]
+                              for i, is_reversed in zip(order, reversed_flags)]
+    
+    
+    
+    
+    def get_reference_geometry(self, N_per_curve=50, adaptive=False):
+        '''
+        Samples every path of the image with one vectorized evaluation.
+        
+        Parameters
+        ----------
+        N_per_curve : number of points per function (average number if adaptive)
+        adaptive : True distributes the points proportional to the (approximate) length of the functions
+        
+        Returns
+        -------
+        Numpy-array of shape (points, 2) with x and y coordinates, the paths are separated by a row of NaN
+        (so that discontinuities are not connected if the whole array is plotted at once)
+        '''
+        func_count = self.reference_table.shape[0]
+        if adaptive:
+            # length of every function approximated by a polyline with 8 points
+            t_rough = np.tile(np.linspace(0, 1, 8), func_count)
+            rough_points = _horner(self.reference_table, np.repeat(np.arange(func_count), 8), t_rough).reshape(func_count, 8)
+            lengths = np.sum(np.abs(np.diff(rough_points, axis=1)), axis=1)
+            n_samples = np.maximum(2, np.ceil(N_per_curve * func_count * lengths / max(np.sum(lengths), 1e-300))).astype(int)
+        else:
+            n_samples = np.full(func_count, N_per_curve)
+        
+        # parameter t of every sample: 0, ..., 1 for every function
+        func_index = np.repeat(np.arange(func_count), n_samples)
+        first_sample = np.cumsum(n_samples) - n_samples
+        t_param = (np.arange(func_index.shape[0]) - first_sample[func_index]) / np.maximum(n_samples[func_index] - 1, 1)
+        points = _horner(self.reference_table, func_index, t_param)
+        
+        # one NaN row in front of the first sample of every path (except the first path)
+        path_starts = first_sample[self.path_offsets[1:-1]]
+        points = np.insert(points, path_starts, np.nan)
+        return np.stack((points.real, -points.imag), axis=-1) # minus because of some weired normalization?!
     
     
     def get_whole_image(self, N_per_curve=50): # returns all data points for the whole image (takes into account that discontinuities should not be connected)
-        t_param = np.linspace(0, 1, N_per_curve)        
+        packed_points = self.get_reference_geometry(N_per_curve)
+        paths = np.split(packed_points, np.nonzero(np.isnan(packed_points[:,0]))[0])
+        paths = [path[1:] if i > 0 else path for i, path in enumerate(paths)] # remove the NaN rows
         
-        ret_path = [] 
-        #print(points_to_plot)
-        for i, path in enumerate(self.all_paths):
-            points_to_plot = [] # self.get_point(t_param)
-            
-            for func in path:
-                points_to_plot += [func(t_t) for t_t in t_param]
-            
-            ret_path += [points_to_plot]
-        
-        #print(ret_path)
-        #ret_path = np.array(ret_path, dtype=complex)
-        real_part = [[points_t.real for points_t in path] for path in ret_path]
-        imag_part = [[-points_t.imag for points_t in path] for path in ret_path]
-        #print(ret_path)
-        #print(real_part)
-        #print(imag_part)
-        #print(real_part)
+        real_part = [path[:,0].tolist() for path in paths]
+        imag_part = [path[:,1].tolist() for path in paths]
         return real_part, imag_part # minus because of some weired normalization?!
     
     
@@ -123,14 +434,16 @@ class SVG_Handler():
         return use_func(use_t)
     
     
+    def get_segment_boundaries(self, reverse=False): # parameters t where one function ends and the next one begins (kinks/jumps of the curve)
+        return self.curve.get_segment_boundaries(reverse=reverse)
+    
+    
     def get_point(self, t, reverse=False):
-        if isinstance(t, float):
-            t = [t]
-            
-        t = np.array(t)
-        
-        assert np.all(0 <= t) and np.all(t <= 1), "t has to be between 0 and 1"
-        return np.array([self._single_points(t_t, reverse) for t_t in t])
+        return self.curve.get_point(t, reverse=reverse)
+    
+    
+    def get_compiled_curve(self, reverse=False): # picklable callable t -> get_point(t, reverse), for example for worker processes
+        return CompiledCurve(self.poly_table, reverse=reverse, arc_table=self.arc_table)
     
         #if isinstance(t, float):
         #    return self._single_points(t)
@@ -142,3 +455,7 @@ class SVG_Handler():
 
 
 
+def load_handler(path, parametrization=SVG_Handler.PARAM_UNIFORM, **kwargs): # svg file or compiled file (.npz, see SVG_Handler.export_compiled)
+    if path.endswith(".npz"):
+        return SVG_Handler.from_compiled(path, parametrization=parametrization, **kwargs)
+    return SVG_Handler(path, parametrization=parametrization, **kwargs)
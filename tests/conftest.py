@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+
+# the modules are flat files in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def handler():
+    from svg_handler import SVG_Handler
+    return SVG_Handler(os.path.join(ROOT, "images", "img13.svg"))
+
+
+@pytest.fixture(scope="session")
+def curve(handler):
+    return handler.get_compiled_curve(reverse=True)
@@ -0,0 +1,18 @@
+import os
+
+from conftest import ROOT
+from integral_solver import IS
+from svg_handler import SVG_Handler
+from coefficient_cache import CoefficientCache, get_coeff_params
+
+
+def test_key_covers_curve_options():
+    svg_path = os.path.join(ROOT, "images", "img13.svg")
+    base = dict(N=40, T=[0, 1], reverse=True, parametrization=SVG_Handler.PARAM_UNIFORM)
+    key = CoefficientCache.get_key(svg_path, **get_coeff_params(**base))
+    assert key == CoefficientCache.get_key(svg_path, **get_coeff_params(**base))
+
+    variants = [dict(sort_functions=False), dict(two_opt_time=1.0), dict(fft_mode="uniform"), dict(oversampling=8),
+                dict(method=IS.Z_GAUSS_QUAD), dict(n_steps=400), dict(arc_samples=64)]
+    keys = {CoefficientCache.get_key(svg_path, **get_coeff_params(**base, **variant)) for variant in variants}
+    assert len(keys) == len(variants) and not key in keys
@@ -0,0 +1,38 @@
+import numpy as np
+
+from coefficient_set import FourierCoefficientSet
+from fourier_series import get_fourier_data, get_fourier_coeff_fft
+
+
+IND = np.array([-2, -1, 0, 1, 2])
+COEFF = np.array([0.5, 2j, 8, -4, 1]) # |c| = 8, 4, 2, 1, 0.5 after sorting, energy 85.25
+
+
+def test_keep_count():
+    coeff_set = FourierCoefficientSet(IND, COEFF)
+    assert np.array_equal(np.abs(coeff_set.coeff), [8, 4, 2, 1, 0.5])
+    assert len(coeff_set.prune(energy_fraction=0.95)) == 3 # 84 / 85.25 >= 0.95 > 80 / 85.25
+    assert len(coeff_set.prune(max_error=1.5)) == 3 # dropped 1 + 0.5
+    assert len(coeff_set.prune(max_error=1.49)) == 4
+    assert len(coeff_set.prune(max_terms=2)) == 2
+    assert len(coeff_set.prune(energy_fraction=0.95, max_terms=2)) == 2 # every condition holds
+    assert len(coeff_set.prune(energy_fraction=1)) == 5
+
+
+def test_prune_errors(curve):
+    t_eval = np.linspace(0, 1, 500, endpoint=False)
+    for N, kwargs in ((5, dict(max_terms=3)), (40, dict(energy_fraction=0.999))):
+        coeff_set = FourierCoefficientSet(*get_fourier_coeff_fft(curve, N=N))
+        pruned = coeff_set.prune(**kwargs)
+        assert pruned.error_bound >= pruned.rms_error > 0
+        deviation = np.abs(pruned.evaluate(t_eval) - coeff_set.evaluate(t_eval))
+        assert np.amax(deviation) <= pruned.error_bound * (1 + 1e-12)
+        assert np.isclose(np.sqrt(np.mean(deviation**2)), pruned.rms_error) # Parseval on a uniform grid
+
+
+def test_presorted_frames():
+    pruned = FourierCoefficientSet(IND, COEFF).prune(max_terms=4)
+    t_eval = np.linspace(0, 1, 7)
+    frames = get_fourier_data(t_eval, pruned.coeff, pruned.ind, presorted=True)
+    assert np.allclose(frames, get_fourier_data(t_eval, pruned.coeff, pruned.ind))
+    assert np.array_equal(frames, pruned.get_fourier_data(t_eval))
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from integral_solver import IS
+from fourier_series import get_fourier_coeff, get_fourier_coeff_fft, METHOD_FFT
+from coefficient_store import CoefficientStore
+from coefficient_cache import CoefficientCache
+
+
+def test_grow_and_shrink(curve):
+    store = CoefficientStore(curve, n_steps=100)
+    for N in (10, 50, 20):
+        ind, coeff = store.get_fourier_coeff(N)
+        expected_ind, expected = get_fourier_coeff(curve, N=N, n_steps=100)
+        assert np.array_equal(ind, expected_ind)
+        assert np.allclose(coeff, expected, rtol=0, atol=1e-13 * np.amax(np.abs(expected)))
+    assert store.N == 50
+
+
+def test_fft_method(curve):
+    store = CoefficientStore(curve, method_string=METHOD_FFT)
+    store.get_fourier_coeff(10)
+    for N in (50, 20):
+        ind, coeff = store.get_fourier_coeff(N)
+        assert np.array_equal(coeff, get_fourier_coeff_fft(curve, N=N)[1])
+
+
+def test_adaptive_not_possible(curve):
+    with pytest.raises(AssertionError):
+        CoefficientStore(curve, method_string=IS.Z_ADAPTIVE_GK)
+
+
+def test_refine_to_error(curve):
+    store = CoefficientStore(curve)
+    target = 0.5 * store.get_error(16)
+    ind, coeff, error = store.refine_to_error(target, N_start=4)
+    assert error <= target
+    assert ind.shape[0] // 2 < 2000 # stopped before N_max
+    assert np.isclose(error, store.get_error(ind.shape[0] // 2))
+
+
+def test_growing_cache_entry(curve, tmp_path):
+    cache = CoefficientCache(str(tmp_path))
+    svg_path = str(tmp_path / "curve.svg")
+    with open(svg_path, "w") as svg_file:
+        svg_file.write("<svg/>")
+    calls = []
+    def calc_coeff(N):
+        calls.append(N)
+        return get_fourier_coeff_fft(curve, N=N)
+    make_store = lambda: CoefficientStore(curve, method_string=METHOD_FFT)
+
+    for N in (20, 10, 40):
+        ind, coeff = cache.get_growing_coeff(svg_path, N, lambda: calc_coeff(N), make_store, method=METHOD_FFT)
+        assert np.array_equal(ind, np.arange(-N, N+1))
+        assert np.array_equal(coeff, get_fourier_coeff_fft(curve, N=N)[1])
+    assert calls == [20] # N=10 is a slice, N=40 only calculates the new indizes
+    assert len(cache.load(CoefficientCache.get_key(svg_path, method=METHOD_FFT))[0]) == 81
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from integral_solver import IS
+from fourier_series import (get_fourier_coeff, get_fourier_coeff_parallel, get_fourier_coeff_fft, FFT_MODE_GAUSS, FFT_MODE_UNIFORM,
+                            fourier_eval, fourier_eval_chunks, get_fourier_data, get_fourier_vector_line)
+
+
+def test_fft_gauss_matches_quadrature(curve):
+    ind, coeff = get_fourier_coeff(curve, N=40, n_steps=200, n_gauss_param=6)
+    fft_ind, fft_coeff = get_fourier_coeff_fft(curve, N=40, mode=FFT_MODE_GAUSS, n_steps=200, n_gauss_param=6)
+    assert np.array_equal(ind, fft_ind)
+    assert np.allclose(fft_coeff, coeff, rtol=0, atol=1e-12 * np.amax(np.abs(coeff)))
+
+
+def test_fft_uniform_close_to_quadrature(curve):
+    ind, coeff = get_fourier_coeff(curve, N=40, n_steps=400, n_gauss_param=6)
+    _, fft_coeff = get_fourier_coeff_fft(curve, N=40, mode=FFT_MODE_UNIFORM, n_steps=4000)
+    assert np.amax(np.abs(fft_coeff - coeff)) < 1e-3 * np.amax(np.abs(coeff))
+
+
+def test_fft_exact_for_trigonometric_polynomial():
+    ind_true = np.array([-3, 0, 2, 5])
+    coeff_true = np.array([1+2j, -0.5, 0.25j, 3])
+    func = lambda t: np.exp(-2j*np.pi * np.outer(t, ind_true)) @ coeff_true # c_k uses exp(+2 pi i k t)
+    for mode in (FFT_MODE_GAUSS, FFT_MODE_UNIFORM):
+        ind, coeff = get_fourier_coeff_fft(func, N=6, mode=mode)
+        expected = np.zeros(ind.shape[0], dtype=complex)
+        expected[ind_true + 6] = coeff_true
+        assert np.allclose(coeff, expected, atol=1e-12)
+
+
+def _eval_chunks(ind, coeff, t_eval):
+    return np.concatenate([values for _, values in fourier_eval_chunks(ind, coeff, t_eval, chunk_size=7)])
+
+
+def test_fourier_eval_matches_chunks(curve):
+    ind, coeff = get_fourier_coeff_fft(curve, N=30)
+    grids = [np.linspace(0, 1, 11), # uniform, step divides the period --> inverse FFT
+             np.linspace(1, 0, 11), # descending
+             np.linspace(0.3, -0.7, 41, endpoint=False),
+             np.linspace(0, 1, 37), # uniform, step does not divide the period
+             np.sort(np.random.default_rng(0).random(50))] # not uniform
+    scale = np.sum(np.abs(coeff))
+    for t_eval in grids:
+        assert np.allclose(fourier_eval(ind, coeff, t_eval), _eval_chunks(ind, coeff, t_eval), rtol=0, atol=1e-12 * scale)
+    assert np.isclose(fourier_eval(ind, coeff, 0.25), _eval_chunks(ind, coeff, [0.25])[0], rtol=0, atol=1e-12 * scale)
+
+
+@pytest.mark.parametrize("method_string", [IS.Z_GAUSS_QUAD, IS.Z_ADAPTIVE_GK])
+def test_parallel_identical_to_serial(curve, method_string):
+    N = 70 # three chunks, the last one is shorter
+    ind, coeff = get_fourier_coeff(curve, N=N, method_string=method_string, n_steps=50)
+    for n_workers in (1, 2):
+        ind_parallel, coeff_parallel = get_fourier_coeff_parallel(curve, N=N, n_workers=n_workers, method_string=method_string, n_steps=50)
+        assert np.array_equal(ind, ind_parallel)
+        assert np.array_equal(coeff, coeff_parallel)
+
+
+def test_fourier_data_matches_vector_line(curve):
+    ind, coeff = get_fourier_coeff_fft(curve, N=25)
+    t_eval = np.linspace(0, 2, 37)
+    frames = get_fourier_data(t_eval, coeff, ind, period=2, max_chunk_mb=0.01) # several chunks
+    assert frames.shape == (37, 52, 2)
+    for t, frame in zip(t_eval, frames):
+        line = get_fourier_vector_line(t, coeff, ind, period=2)
+        assert np.allclose(frame[:,0] - 1j*frame[:,1], line, rtol=0, atol=1e-12 * np.sum(np.abs(coeff)))
@@ -0,0 +1,61 @@
+import pickle
+
+import numpy as np
+
+import frame_source
+from frame_source import FourierFrameSource
+from frame_store import FrameStore
+from fourier_series import get_fourier_data, get_fourier_data_chunks
+
+
+def _get_series():
+    rng = np.random.default_rng(1)
+    ind = np.arange(-20, 21)
+    return ind, (rng.normal(size=41) + 1j*rng.normal(size=41)) / (1 + np.abs(ind))
+
+
+def test_frames_and_bounds():
+    ind, coeff = _get_series()
+    t_eval = np.linspace(0, 1, 500)
+    expected = get_fourier_data(t_eval, coeff, ind)
+    source = FourierFrameSource(t_eval, coeff, ind, look_ahead=4)
+    for index in (0, 7, 14, 21, 499, 3):
+        assert np.allclose(source[index], expected[index])
+    (x_min, x_max), (y_min, y_max) = source.bounds
+    assert x_min <= expected[...,0].min() and expected[...,0].max() <= x_max
+    assert y_min <= expected[...,1].min() and expected[...,1].max() <= y_max
+    source.close()
+
+
+def test_bounds_without_frames(monkeypatch):
+    ind, coeff = _get_series()
+    def no_frames(*args, **kwargs):
+        raise AssertionError("bounds must not calculate frames")
+    monkeypatch.setattr(frame_source, "get_fourier_data_chunks", no_frames)
+    source = FourierFrameSource(np.linspace(0, 1, 20000), coeff, ind, prefetch=False)
+    assert np.allclose(source.bounds, [[-np.sum(np.abs(coeff)), np.sum(np.abs(coeff))]] * 2)
+    assert len(source._frames) == 0
+
+
+def test_pickle():
+    ind, coeff = _get_series()
+    t_eval = np.linspace(0, 1, 100)
+    source = FourierFrameSource(t_eval, coeff, ind)
+    source[5]
+    copy = pickle.loads(pickle.dumps(source))
+    assert np.allclose(copy[50], get_fourier_data(t_eval, coeff, ind)[50])
+    source.close()
+    copy.close()
+
+
+def test_frame_store_pickles_its_path(tmp_path):
+    ind, coeff = _get_series()
+    t_eval = np.linspace(0, 1, 200)
+    store = FrameStore(str(tmp_path / "frames.npy"), t_eval.shape[0], coeff.shape[0]+1)
+    store.write(get_fourier_data_chunks(t_eval, coeff, ind))
+    data = pickle.dumps(store)
+    assert len(data) < 1000 # no copy of the frames
+    copy = pickle.loads(data)
+    assert isinstance(copy.frames, np.memmap)
+    assert np.array_equal(copy[123], get_fourier_data(t_eval, coeff, ind)[123])
+    assert copy.bounds == store.bounds
@@ -0,0 +1,23 @@
+import tracemalloc
+
+import numpy as np
+
+import instrumentation
+
+
+def test_nested_stage_keeps_peak_of_outer_stage():
+    was_tracing = tracemalloc.is_tracing()
+    instrumentation.enable(memory=True)
+    try:
+        with instrumentation.stage("outer"):
+            data = np.ones(2**20) # 8 MB, freed before the inner stage starts
+            del data
+            with instrumentation.stage("inner"):
+                data = np.ones(2**10)
+        stages = instrumentation.get_summary()["stages"]
+    finally:
+        instrumentation.disable()
+        if not was_tracing:
+            tracemalloc.stop()
+    assert stages["outer"]["peak_memory"] >= 8 * 2**20
+    assert stages["inner"]["peak_memory"] < 2**20
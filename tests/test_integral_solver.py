@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from integral_solver import IS
+from fourier_series import get_fourier_coeff
+
+
+def test_adaptive_kink():
+    solver = IS(lambda t: np.abs(t - 0.3), [0, 1], method_string=IS.Z_ADAPTIVE_GK)
+    integral, error_estimate = solver.get_approximation(4, return_error_estimate=True)
+    exact = 0.3**2 / 2 + 0.7**2 / 2
+    assert error_estimate <= IS.ADAPTIVE_TOLERANCE
+    assert abs(integral - exact) <= IS.ADAPTIVE_TOLERANCE
+
+
+def test_adaptive_breakpoint():
+    step = lambda t: np.where(t < 1/3, 1.0, np.exp(t)) # jump at 1/3, not a boundary of the initial subintervals
+    exact = 1/3 + np.e - np.exp(1/3)
+    solver = IS(step, [0, 1], method_string=IS.Z_ADAPTIVE_GK)
+    integral, error_estimate = solver.get_approximation(4, breakpoints=[1/3], max_level=0, return_error_estimate=True)
+    assert abs(integral - exact) < 1e-14 # smooth on every subinterval --> no bisection needed
+    assert error_estimate < 1e-14
+    
+    integral, error_estimate = solver.get_approximation(4, tolerance=1e-6, return_error_estimate=True) # without breakpoint the jump is bisected
+    assert error_estimate <= 1e-6
+    assert abs(integral - exact) <= 1e-6
+
+
+def test_adaptive_coeff_uses_segment_boundaries(curve):
+    _, coeff = get_fourier_coeff(curve, N=20, method_string=IS.Z_ADAPTIVE_GK, n_steps=4)
+    _, explicit_coeff = get_fourier_coeff(curve, N=20, method_string=IS.Z_ADAPTIVE_GK, n_steps=4,
+                                          breakpoints=curve.get_segment_boundaries(reverse=curve.reverse))
+    _, plain_coeff = get_fourier_coeff(curve, N=20, method_string=IS.Z_ADAPTIVE_GK, n_steps=4, breakpoints=[])
+    assert np.array_equal(coeff, explicit_coeff)
+    assert np.amax(np.abs(coeff - plain_coeff)) < 10 * IS.ADAPTIVE_TOLERANCE
+
+
+@pytest.mark.parametrize("method_string", [IS.Z_GAUSS_QUAD, IS.Z_TRAPEZOIDAL, IS.Z_ADAPTIVE_GK])
+def test_batch_matches_single(curve, method_string):
+    frequencies = np.arange(-12, 13)
+    batch = IS(curve, [0, 1], method_string=method_string).get_batch_approximation(20, frequencies=frequencies, n_gauss_param=6, chunk_size=7)
+    assert batch.shape == frequencies.shape
+    for w, integral in zip(frequencies, batch):
+        solver = IS(lambda t: curve(t) * np.exp(2j*np.pi*w*t), [0, 1], method_string=method_string)
+        assert np.isclose(integral, solver.get_approximation(20, n_gauss_param=6), rtol=0, atol=1e-12)
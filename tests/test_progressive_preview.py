@@ -0,0 +1,28 @@
+import gc
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pytest
+
+from progressive_preview import ProgressivePreview, get_levels
+from animation import fourier_animation
+
+
+def test_levels():
+    levels = get_levels(160, 3000)
+    assert [N for N, _ in levels] == [8, 36, 160]
+    assert levels[-1][1] == 3000
+
+
+@pytest.mark.filterwarnings("ignore:Animation was deleted without rendering")
+def test_preview_duration(curve):
+    animation_time, frames_per_sec = 30, 25
+    preview = ProgressivePreview(curve, levels=get_levels(40, 3000))
+    figure_data, fourier_data = preview.get_first() # 1000 points, one frame per point would take 40 s
+    anim = fourier_animation(figure_data, fourier_data, animation_time=animation_time, show=False, data_updates=preview.get_update)
+    assert len(list(anim.new_frame_seq())) == animation_time * frames_per_sec
+    preview.close()
+    plt.close("all")
+    del anim # nothing rendered, the warning of the deleted animation is expected here
+    gc.collect()
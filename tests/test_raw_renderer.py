@@ -0,0 +1,47 @@
+import os
+import sys
+
+import numpy as np
+
+from fourier_series import get_fourier_coeff_fft, get_fourier_data, fourier_eval
+from raw_renderer import RawFrameRenderer, save_raw_video, _get_frame_numbers
+
+
+FAKE_FFMPEG = f"""#!{sys.executable}
+import sys
+with open(sys.argv[-1], "wb") as output: # raw frames of stdin instead of a video
+    output.write(sys.stdin.buffer.read())
+"""
+
+
+def _get_data(curve, n_eval):
+    ind, coeff = get_fourier_coeff_fft(curve, N=10)
+    t_eval = np.linspace(0, 1, n_eval)
+    points = fourier_eval(ind, coeff, t_eval)
+    return np.stack((points.real, -points.imag), axis=-1), get_fourier_data(t_eval, coeff, ind)
+
+
+def test_frame_numbers():
+    assert _get_frame_numbers(3000, 20, 25).shape[0] == 500 # 6 points per frame
+    assert _get_frame_numbers(3001, 20, 25).shape[0] == 500
+    assert np.array_equal(_get_frame_numbers(300, 20, 25), np.arange(300)) # at least one point per frame
+
+
+def test_frame_size(curve):
+    figure_data, fourier_data = _get_data(curve, 50)
+    renderer = RawFrameRenderer(figure_data, fourier_data, width=321, height=241)
+    for num in (0, 10, 49):
+        frame = renderer.get_frame(num)
+        assert frame.shape == (240, 320, 3) and frame.dtype == np.uint8 # even sizes for yuv420p
+
+
+def test_raw_video_frames(curve, tmp_path):
+    ffmpeg = str(tmp_path / "ffmpeg")
+    with open(ffmpeg, "w") as script:
+        script.write(FAKE_FFMPEG)
+    os.chmod(ffmpeg, 0o755)
+
+    figure_data, fourier_data = _get_data(curve, 300)
+    output = str(tmp_path / "video.raw")
+    save_raw_video(figure_data, fourier_data, output, animation_time=2, fps=25, width=64, height=48, ffmpeg=ffmpeg)
+    assert os.path.getsize(output) == 50 * 64 * 48 * 3 # 6 points per frame
@@ -0,0 +1,84 @@
+import os
+import json
+import threading
+import urllib.request
+import urllib.error
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from conftest import ROOT
+from render_service import RenderService, BadRequest, _RequestHandler
+
+
+@pytest.fixture(scope="module")
+def server_url(tmp_path_factory):
+    _RequestHandler.service = RenderService(work_dir=str(tmp_path_factory.mktemp("service")), n_workers=1, use_disk_cache=False)
+    _RequestHandler.log_message = lambda self, *args: None # quiet test output
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _post(url, body, content_type="application/json"):
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": content_type}, method="POST")
+    try:
+        with urllib.request.urlopen(request) as answer:
+            return answer.status, answer.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read()
+
+
+def test_bad_requests(server_url):
+    svg = open(os.path.join(ROOT, "images", "img13.svg")).read()
+    for body in (b"[1, 2]", b'"svg"', b"{}", b"no json", json.dumps({"svg": svg, "N": -1}).encode(),
+                 json.dumps({"svg": svg, "N": [1]}).encode(), json.dumps({"svg": svg, "parametrization": "x"}).encode(),
+                 json.dumps({"svg": svg, "N": 2.5}).encode(), json.dumps({"svg": svg, "N": 10**6}).encode(),
+                 json.dumps({"svg": svg, "n_eval": 10**9}).encode(), json.dumps({"svg": svg, "width": 0}).encode(),
+                 json.dumps({"svg": svg, "width": 10**5}).encode(), json.dumps({"svg": svg, "fps": 0}).encode(),
+                 json.dumps({"svg": svg, "animation_time": -1}).encode()):
+        status, content = _post(server_url + "/latex", body)
+        assert status == 400, body
+        assert "error" in json.loads(content)
+
+
+def test_body_size_limit(server_url, monkeypatch):
+    monkeypatch.setattr(_RequestHandler, "max_body_size", 100)
+    status, _ = _post(server_url + "/latex", bytes(1000), content_type="image/svg+xml")
+    assert status == 413
+
+
+def test_error_without_traceback(server_url):
+    status, content = _post(server_url + "/latex", b"<svg", content_type="image/svg+xml")
+    assert status == 500
+    assert not "Traceback" in json.loads(content)["error"]
+
+
+def test_desmos(server_url):
+    with open(os.path.join(ROOT, "images", "img13.svg"), "rb") as svg_file:
+        status, content = _post(server_url + "/desmos?N=3", svg_file.read(), content_type="image/svg+xml")
+    assert status == 200 and b"cos" in content
+
+
+def test_svg_store_is_bounded(tmp_path):
+    service = RenderService(work_dir=str(tmp_path), n_workers=1, max_svg_mb=1e-3, use_disk_cache=False) # about 1 kB
+    paths = []
+    for i in range(5):
+        paths += [service.store_svg(b"<svg>" + bytes(400) + str(i).encode() + b"</svg>")]
+        service.release_svg(paths[-1])
+    assert os.path.isfile(paths[-1])
+    assert sum(os.path.isfile(path) for path in paths) <= 2
+
+    with pytest.raises(BadRequest): # larger than the whole store
+        service.store_svg(bytes(2000))
+
+
+def test_svg_in_use_is_not_evicted(tmp_path):
+    service = RenderService(work_dir=str(tmp_path), n_workers=1, max_svg_mb=1e-3, use_disk_cache=False)
+    in_use = service.store_svg(b"<svg>" + bytes(600) + b"</svg>")
+    new = service.store_svg(b"<svg>" + bytes(700) + b"</svg>") # both together are larger than the store
+    assert os.path.isfile(in_use) and os.path.isfile(new)
+    service.release_svg(in_use)
+    service.release_svg(new)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from svg_handler import SVG_Handler, load_handler
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+@pytest.mark.parametrize("parametrization", [SVG_Handler.PARAM_UNIFORM, SVG_Handler.PARAM_ARC_LENGTH])
+def test_compiled_round_trip(handler, tmp_path, mmap, parametrization):
+    compiled_path = str(tmp_path / "img13.npz")
+    handler.export_compiled(compiled_path)
+    compiled = load_handler(compiled_path, parametrization=parametrization, mmap=mmap)
+    original = handler if parametrization == handler.parametrization else SVG_Handler(handler.path, parametrization=parametrization)
+
+    t = np.linspace(0, 1, 1001)
+    for reverse in (False, True):
+        assert np.array_equal(compiled.get_point(t, reverse=reverse), original.get_point(t, reverse=reverse))
+        assert np.array_equal(compiled.get_compiled_curve(reverse=reverse)(t), original.get_compiled_curve(reverse=reverse)(t))
+    assert np.array_equal(compiled.get_reference_geometry(), original.get_reference_geometry(), equal_nan=True)
+
+
+def _jump_length(functions): # sum of the jumps of the closed curve
+    starts = np.array([func(0) for func in functions])
+    ends = np.array([func(1) for func in functions])
+    return np.sum(np.abs(np.roll(starts, -1) - ends))
+
+
+def _get_segments(shuffle):
+    # closed polygon of 60 lines, shuffled and every third line reversed
+    corners = np.exp(2j*np.pi * np.arange(61) / 60)
+    lines = [np.poly1d([corners[i+1] - corners[i], corners[i]]) for i in range(60)]
+    lines = [np.poly1d([-line.coeffs[0], line(1)]) if i % 3 == 1 else line for i, line in enumerate(lines)]
+    return [lines[i] for i in shuffle]
+
+
+@pytest.mark.parametrize("two_opt_time", [0.0, 0.5])
+def test_sort_functions(two_opt_time):
+    shuffle = np.random.default_rng(2).permutation(60)
+    original = _get_segments(shuffle)
+    handler = SVG_Handler.__new__(SVG_Handler)
+    handler.all_functions = list(original)
+    handler._sort_functions(two_opt_time=two_opt_time)
+
+    # every segment is kept (possibly reversed)
+    point = lambda z: (round(z.real, 9), round(z.imag, 9))
+    endpoints = lambda functions: sorted(tuple(sorted((point(func(0)), point(func(1))))) for func in functions)
+    assert len(handler.all_functions) == 60
+    assert endpoints(handler.all_functions) == endpoints(original)
+    assert _jump_length(handler.all_functions) <= _jump_length(original)
+    assert _jump_length(handler.all_functions) < 1e-9 # the polygon is closed again, the reversed lines are turned around
+
+
+def test_sort_auto_threshold(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(SVG_Handler, "_sort_functions", lambda self, two_opt_time=0.0: calls.append(self.line_count))
+    for line_count in (SVG_Handler.SORT_MIN_FUNCTIONS - 1, SVG_Handler.SORT_MIN_FUNCTIONS):
+        svg_path = str(tmp_path / f"lines{line_count}.svg")
+        path_data = "M 0 0 " + " ".join(f"L {i+1} {(i+1) % 2}" for i in range(line_count))
+        with open(svg_path, "w") as svg_file:
+            svg_file.write(f'<svg xmlns="http://www.w3.org/2000/svg"><path d="{path_data}"/></svg>')
+        SVG_Handler(svg_path)
+    assert calls == [SVG_Handler.SORT_MIN_FUNCTIONS]
+
+
+def test_get_point_matches_scalar_functions(handler):
+    t = np.linspace(0, 1, 997) # not aligned with the function boundaries
+    for reverse in (False, True):
+        points = handler.get_point(t, reverse=reverse)
+        assert points.shape == t.shape
+        scalar_points = np.array([handler._single_points(t_i, reverse) for t_i in t]) # one poly1d per function
+        assert np.allclose(points, scalar_points, rtol=0, atol=1e-9 * np.amax(np.abs(scalar_points)))
+
+
+def test_arc_length_speed(handler, tmp_path):
+    compiled_path = str(tmp_path / "img13.npz")
+    handler.export_compiled(compiled_path)
+    arc_handler = load_handler(compiled_path, parametrization=SVG_Handler.PARAM_ARC_LENGTH)
+    
+    t = np.linspace(0, 1, 20001)
+    for reverse in (False, True):
+        lengths = np.sum(np.abs(np.diff(arc_handler.get_point(t, reverse=reverse))).reshape(200, 100), axis=1) # length of 200 equal t intervals
+        median = np.median(lengths)
+        assert np.mean(np.abs(lengths - median) < 0.02 * median) > 0.95 # all except the intervals with a jump between two paths